@@ -1,5 +1,5 @@
-import os
-import json
+import asyncio
+import requests
 from aiohttp import web
 from server import PromptServer
 from comfy_api.latest import ComfyExtension, io
@@ -7,23 +7,25 @@ from comfy_api.latest import ComfyExtension, io
 from .nodes.EmbeddrUploadImage import EmbeddrSaveToFolderNode
 from .nodes.EmbeddrLoadImage import EmbeddrLoadImageNode
 from .nodes.EmbeddrLoadImages import EmbeddrLoadImagesNode
+from .nodes.EmbeddrLoadImagesPaged import EmbeddrLoadImagesPagedNode
 from .nodes.EmbeddrMergeIDs import EmbeddrMergeIDsNode
 from .nodes.EmbeddrFindSimilar import EmbeddrFindSimilarNode
 from .nodes.EmbeddrFindSimilarText import EmbeddrFindSimilarTextNode
+from .nodes.EmbeddrFindSimilarLocal import EmbeddrFindSimilarLocalNode
 from .nodes.EmbeddrUploadVideo import EmbeddrUploadVideo
-
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
+from .nodes.utils import config as embeddr_config
+from .nodes.utils.cache import get_image_cache
+from .nodes.utils.catalog import get_catalog, refresh_catalog
+from .nodes.utils.disk_cache import get_disk_cache
+from .nodes.utils import spool
+from .nodes.utils import vector_index
+from .nodes.utils import metrics
+from .nodes.utils import thumbs
+from .nodes.utils import dedupe
 
 
 def get_api_key():
-    if os.path.exists(CONFIG_PATH):
-        try:
-            with open(CONFIG_PATH, "r") as f:
-                config = json.load(f)
-                return config.get("api_key", "")
-        except Exception:
-            return ""
-    return ""
+    return embeddr_config.get_config().get("api_key", "")
 
 
 @PromptServer.instance.routes.post("/embeddr/config")
@@ -31,30 +33,15 @@ async def save_config(request):
     try:
         data = await request.json()
         print(f"[Embeddr] Saving config: {data}")
-        api_key = data.get("api_key")
-        endpoint = data.get("endpoint")
-        mode = data.get("mode")
-        grid_preview_contain = data.get("grid_preview_contain")
-
-        config = {}
-        if os.path.exists(CONFIG_PATH):
-            try:
-                with open(CONFIG_PATH, "r") as f:
-                    config = json.load(f)
-            except:
-                pass
-
-        if api_key is not None:
-            config["api_key"] = api_key
-        if endpoint is not None:
-            config["endpoint"] = endpoint
-        if mode is not None:
-            config["mode"] = mode
-        if grid_preview_contain is not None:
-            config["grid_preview_contain"] = grid_preview_contain
-
-        with open(CONFIG_PATH, "w") as f:
-            json.dump(config, f)
+
+        updates = {}
+        for key in ("api_key", "endpoint", "mode", "grid_preview_contain"):
+            if data.get(key) is not None:
+                updates[key] = data[key]
+
+        # Write on a worker thread so the disk flush never stalls the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, embeddr_config.update_config, updates)
 
         return web.json_response({"status": "success"})
     except Exception as e:
@@ -63,13 +50,7 @@ async def save_config(request):
 
 @PromptServer.instance.routes.get("/embeddr/config")
 async def get_config(request):
-    config = {}
-    if os.path.exists(CONFIG_PATH):
-        try:
-            with open(CONFIG_PATH, "r") as f:
-                config = json.load(f)
-        except:
-            pass
+    config = embeddr_config.get_config()
 
     endpoint = config.get("endpoint", "http://localhost:8003")
     mode = config.get("mode", "local")
@@ -83,13 +64,130 @@ async def get_config(request):
     })
 
 
+@PromptServer.instance.routes.get("/embeddr/metrics")
+async def get_metrics(request):
+    loop = asyncio.get_running_loop()
+    body = await loop.run_in_executor(None, metrics.render)
+    return web.Response(text=body, content_type="text/plain", charset="utf-8",
+                        headers={"X-Prometheus-Format": "0.0.4"})
+
+
+@PromptServer.instance.routes.get("/embeddr/cache")
+async def get_cache_stats(request):
+    loop = asyncio.get_running_loop()
+    disk_cache = get_disk_cache()
+    return web.json_response({
+        "images": get_image_cache().stats(),
+        "thumbs": thumbs.get_thumb_cache().stats(),
+        "duplicates": await loop.run_in_executor(None, dedupe.stats),
+        "files": disk_cache.stats() if disk_cache is not None else None,
+    })
+
+
+@PromptServer.instance.routes.post("/embeddr/cache/clear")
+async def clear_cache(request):
+    get_image_cache().clear()
+    thumbs.get_thumb_cache().clear()
+    # Also forgets known upload IDs, e.g. after images were deleted on the server
+    await asyncio.get_running_loop().run_in_executor(None, dedupe.clear)
+    disk_cache = get_disk_cache()
+    if disk_cache is not None:
+        disk_cache.clear()
+    return web.json_response({"status": "success"})
+
+
+@PromptServer.instance.routes.get("/embeddr/thumb/{image_id}")
+async def get_thumb(request):
+    image_id = request.match_info["image_id"]
+    if not image_id.isdigit():
+        return web.json_response({"status": "error", "message": "invalid image id"}, status=400)
+    size = thumbs.clamp_size(request.query.get("size"))
+
+    try:
+        # Fetching and resizing run on a worker thread, off the event loop
+        loop = asyncio.get_running_loop()
+        content, etag = await loop.run_in_executor(None, thumbs.get_thumb, image_id, size)
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else 502
+        return web.json_response({"status": "error", "message": str(e)},
+                                 status=404 if status == 404 else 502)
+    except Exception as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=502)
+
+    # The URL doesn't name the endpoint, so the browser must revalidate every
+    # time; a matching ETag is a cheap 304 served from the thumbnail cache
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=content, content_type=thumbs.THUMB_MIME, headers=headers)
+
+
+@PromptServer.instance.routes.get("/embeddr/catalog")
+async def get_catalog_route(request):
+    loop = asyncio.get_running_loop()
+    return web.json_response(await loop.run_in_executor(None, get_catalog))
+
+
+@PromptServer.instance.routes.post("/embeddr/catalog/refresh")
+async def refresh_catalog_route(request):
+    try:
+        loop = asyncio.get_running_loop()
+        catalog = await loop.run_in_executor(None, refresh_catalog)
+        return web.json_response(catalog)
+    except Exception as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=502)
+
+
+@PromptServer.instance.routes.get("/embeddr/spool")
+async def get_spool_status(request):
+    loop = asyncio.get_running_loop()
+    return web.json_response(await loop.run_in_executor(None, spool.get_status))
+
+
+@PromptServer.instance.routes.post("/embeddr/spool/retry")
+async def retry_spool(request):
+    loop = asyncio.get_running_loop()
+    count = await loop.run_in_executor(None, spool.retry_failed)
+    return web.json_response({"status": "success", "requeued": count})
+
+
+def _index_scope(values):
+    library_id = values.get("library_id")
+    collection_id = values.get("collection_id")
+    return (int(library_id) if library_id not in (None, "") else None,
+            int(collection_id) if collection_id not in (None, "") else None)
+
+
+@PromptServer.instance.routes.get("/embeddr/index")
+async def get_index_status(request):
+    library_id, collection_id = _index_scope(request.query)
+    loop = asyncio.get_running_loop()
+    index = await loop.run_in_executor(None, vector_index.get_index, library_id, collection_id)
+    return web.json_response(index.stats())
+
+
+@PromptServer.instance.routes.post("/embeddr/index/sync")
+async def sync_index(request):
+    try:
+        data = await request.json() if request.can_read_body else {}
+        library_id, collection_id = _index_scope(data)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, lambda: vector_index.sync_index(library_id, collection_id, full=bool(data.get("full"))))
+        return web.json_response(result)
+    except Exception as e:
+        return web.json_response({"status": "error", "message": str(e)}, status=502)
+
+
 class EmbeddrComfyUIExtension(ComfyExtension):
     async def get_node_list(self) -> list[type[io.ComfyNode]]:
         return [
             EmbeddrFindSimilarNode,
             EmbeddrFindSimilarTextNode,
+            EmbeddrFindSimilarLocalNode,
             EmbeddrLoadImageNode,
             EmbeddrLoadImagesNode,
+            EmbeddrLoadImagesPagedNode,
             EmbeddrMergeIDsNode,
             EmbeddrSaveToFolderNode,
             EmbeddrUploadVideo,
@@ -98,6 +196,8 @@ class EmbeddrComfyUIExtension(ComfyExtension):
 
 async def comfy_entrypoint() -> ComfyExtension:
     print("[EmbeddrComfyUIExtension] Initializing Embeddr ComfyUI Extension...")
+    # Drain uploads spooled before the last shutdown
+    spool.start_worker()
     print("[EmbeddrComfyUIExtension] Extension initialized.")
     return EmbeddrComfyUIExtension()
 
@@ -0,0 +1,253 @@
+"""
+Stand-in for the Embeddr /api/v1 API, good enough to drive every node.
+
+Serves a fixed set of generated JPEGs (plus thumbnails), the listing and
+search routes, uploads (single-shot and resumable), collection membership
+and embedding export. A per-request latency can be injected to mimic a
+remote server.
+"""
+import io
+import re
+import sys
+import json
+import time
+import random
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from PIL import Image
+
+
+def make_jpeg(width, height, seed, quality=90):
+    rng = np.random.default_rng(seed)
+    # Smooth gradients plus noise compress like photos rather than flat fills
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([(x * 255 // max(1, width - 1)),
+                     (y * 255 // max(1, height - 1)),
+                     np.full_like(x, seed * 37 % 256)], axis=-1)
+    noise = rng.integers(0, 24, size=(height, width, 3))
+    array = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(array).save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+class FakeEmbeddrServer:
+    def __init__(self, image_count=100, width=2048, height=1536, thumb_size=512,
+                 embedding_dim=512, latency_ms=0.0, keep_bodies=False):
+        self.latency = latency_ms / 1000.0
+        self.keep_bodies = keep_bodies
+        self.files = {}
+        self.thumbnails = {}
+        unique = min(image_count, 8)
+        # A handful of distinct payloads reused across IDs keeps startup fast
+        payloads = [make_jpeg(width, height, seed) for seed in range(unique)]
+        scale = thumb_size / max(width, height)
+        thumbs = [make_jpeg(max(1, int(width * scale)), max(1, int(height * scale)), seed)
+                  for seed in range(unique)]
+        for image_id in range(1, image_count + 1):
+            self.files[image_id] = payloads[image_id % unique]
+            self.thumbnails[image_id] = thumbs[image_id % unique]
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.normal(size=(image_count + 1, embedding_dim)).astype(np.float32)
+        self.uploads = {}
+        # image id -> raw request body, for checking what actually arrived
+        self.upload_bodies = {}
+        self.sessions = {}
+        self._session_count = 0
+        # Resumable-upload fault injection: 1-based PUT numbers that keep only
+        # half their part and then fail, plus what was received, for tests
+        self.drop_puts = set()
+        self.put_ranges = []
+        self.completed_sessions = []
+        self.collection_items = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def start(self):
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        self._httpd = _Server(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="fake-embeddr", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def ids(self):
+        return sorted(self.files)
+
+    def add_upload(self, size, body=None):
+        """Allocate the next image ID and record the upload in one locked step."""
+        with self._lock:
+            image_id = max(self.files) + len(self.uploads) + 1
+            self.uploads[image_id] = size
+            if body is not None and self.keep_bodies:
+                self.upload_bodies[image_id] = body
+            return image_id
+
+    def new_session(self):
+        with self._lock:
+            self._session_count += 1
+            session_id = f"s{self._session_count}"
+            self.sessions[session_id] = bytearray()
+            return session_id
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients aborting mid-body (a failed streaming upload) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                line = self.rfile.readline().strip()
+                if not line:
+                    raise ConnectionAbortedError("client aborted the request body")
+                size = int(line, 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _route(self):
+        fake = self.fake
+        with fake._lock:
+            fake.requests += 1
+        if fake.latency:
+            time.sleep(fake.latency)
+        url = urlparse(self.path)
+        return url.path[len("/api/v1"):], parse_qs(url.query)
+
+    def do_GET(self):
+        path, query = self._route()
+        fake = self.fake
+        if path == "/libraries":
+            return self._send(200, [{"id": 1, "name": "Bench Library"}])
+        if path == "/collections":
+            return self._send(200, [{"id": 1, "name": "Bench Collection"}])
+
+        match = re.fullmatch(r"/images/(\d+)/(file|thumbnail)", path)
+        if match:
+            image_id = int(match[1])
+            store = fake.files if match[2] == "file" else fake.thumbnails
+            if image_id not in store:
+                return self._send(404, {"detail": "not found"})
+            etag = f'"{match[2]}-{image_id}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, headers={"ETag": etag})
+            return self._send(200, store[image_id], "image/jpeg", {"ETag": etag})
+
+        if path == "/images/embeddings":
+            skip = int(query.get("skip", ["0"])[0])
+            limit = int(query.get("limit", ["1000"])[0])
+            ids = fake.ids()[skip:skip + limit]
+            return self._send(200, {"items": [
+                {"id": image_id, "embedding": fake.embeddings[image_id].tolist(),
+                 "updated_at": "2026-01-01T00:00:00"} for image_id in ids]})
+
+        match = re.fullmatch(r"/uploads/(\w+)", path)
+        if match and match[1] in fake.sessions:
+            return self._send(200, {"offset": len(fake.sessions[match[1]])})
+
+        if path == "/images":
+            # Same paging as the real listing: skip/limit, newest first or random
+            limit = int(query.get("limit", ["20"])[0])
+            skip = int(query.get("skip", ["0"])[0])
+            ids = fake.ids()[::-1]
+            if query.get("sort", ["new"])[0] == "random":
+                random.shuffle(ids)
+            page = ids[skip:skip + limit]
+            return self._send(200, {"items": [{"id": image_id} for image_id in page],
+                                    "total": len(ids)})
+        return self._send(404, {"detail": "not found"})
+
+    def do_HEAD(self):
+        return self.do_GET()
+
+    def do_POST(self):
+        path, _ = self._route()
+        fake = self.fake
+        body = self._body()
+        if path == "/images/search/image":
+            limit = int(re.search(rb'name="limit"\r\n\r\n(\d+)', body)[1])
+            return self._send(200, {"items": [{"id": image_id} for image_id in fake.ids()[:limit]]})
+        if path == "/images/upload":
+            image_id = fake.add_upload(len(body), body)
+            return self._send(200, {"id": image_id})
+        if path == "/uploads":
+            session_id = fake.new_session()
+            return self._send(200, {"upload_id": session_id, "offset": 0})
+        match = re.fullmatch(r"/uploads/(\w+)/complete", path)
+        if match:
+            session = fake.sessions.pop(match[1])
+            fake.completed_sessions.append(session)
+            image_id = fake.add_upload(len(session))
+            return self._send(200, {"id": image_id})
+        if re.fullmatch(r"/collections/\d+/items", path):
+            fake.collection_items.append(json.loads(body or b"{}"))
+            return self._send(200, {"status": "ok"})
+        return self._send(404, {"detail": "not found"})
+
+    def do_PUT(self):
+        path, _ = self._route()
+        body = self._body()
+        match = re.fullmatch(r"/uploads/(\w+)", path)
+        if not match or match[1] not in self.fake.sessions:
+            return self._send(404, {"detail": "not found"})
+        fake = self.fake
+        session = fake.sessions[match[1]]
+        start, end = map(int, re.match(r"bytes (\d+)-(\d+)/", self.headers["Content-Range"]).groups())
+        with fake._lock:
+            fake.put_ranges.append((start, end))
+            dropped = len(fake.put_ranges) in fake.drop_puts
+        if start != len(session):
+            return self._send(416, {"offset": len(session)})
+        if dropped:
+            session.extend(body[:len(body) // 2])
+            return self._send(500, {"detail": "connection lost"})
+        session.extend(body)
+        return self._send(200, {"offset": len(session)})
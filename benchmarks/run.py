@@ -0,0 +1,319 @@
+"""
+Benchmark the load, search and upload paths against a local stand-in server.
+
+    python benchmarks/run.py                       # shared client/cache/codec paths only
+    python benchmarks/run.py --comfyui ~/ComfyUI   # also runs each node's execute()
+
+Runs on CPU with no GPU or real Embeddr server. For every scenario it reports
+items/s, p50/p99 latency per iteration and its peak memory: the RSS high-water
+mark above what was live when the scenario started.
+"""
+import gc
+import os
+import sys
+import json
+import ctypes
+import time
+import asyncio
+import types
+import argparse
+import tempfile
+import threading
+import importlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_server import FakeEmbeddrServer  # noqa: E402
+
+
+def import_extension():
+    """
+    Import nodes/ as the package "embeddr_nodes". The repo root __init__.py
+    needs a running PromptServer and ComfyUI has its own top-level "nodes"
+    module, so neither can be imported directly.
+    """
+    package = types.ModuleType("embeddr_nodes")
+    package.__path__ = [os.path.join(ROOT, "nodes")]
+    sys.modules["embeddr_nodes"] = package
+    return package
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+def _trim_heap():
+    """Hand freed heap pages back to the OS (glibc only), so RSS is what is live."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _reset_high_water():
+    """Reset the kernel's RSS high-water mark (Linux 4.0+); False when unavailable."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _high_water_bytes():
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    raise OSError("no VmHWM")
+
+
+class PeakMemory:
+    """
+    Peak memory of one scenario: the RSS high-water mark above the live RSS
+    at its start. Freed heap is trimmed first, otherwise memory the allocator
+    kept from earlier scenarios would absorb this one's peak. Uses the
+    kernel's VmHWM where it can be reset, and samples RSS on a thread elsewhere.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        _trim_heap()
+        self.start = _rss_bytes()
+        self.peak = self.start
+        if not _reset_high_water():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_bytes())
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, _rss_bytes())
+        else:
+            self.peak = max(self.peak, _high_water_bytes())
+
+    @property
+    def growth(self):
+        return self.peak - self.start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def run_scenario(name, fn, items, iterations, setup=None):
+    """fn() runs one iteration handling `items` items; setup() runs untimed before each."""
+    latencies = []
+    with PeakMemory() as memory:
+        for _ in range(iterations):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    return {
+        "scenario": name,
+        "iterations": iterations,
+        "items_per_s": (items * iterations / total) if total else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_rss_mb": memory.growth / (1024 * 1024),
+    }
+
+
+def configure(ext, server, workdir, overrides):
+    config = ext.utils.config
+    config.CONFIG_PATH = os.path.join(workdir, "config.json")
+    ext.utils.catalog.CATALOG_PATH = os.path.join(workdir, "catalog.json")
+    values = {
+        "endpoint": server.endpoint,
+        "disk_cache_dir": os.path.join(workdir, "files"),
+        "spool_dir": os.path.join(workdir, "spool"),
+        "index_dir": os.path.join(workdir, "index"),
+    }
+    values.update(overrides)
+    config.update_config(values)
+
+
+def reset_caches(ext, disk=False):
+    ext.utils.cache.get_image_cache().clear()
+    search_cache = ext.utils.cache.get_search_cache()
+    if search_cache is not None:
+        search_cache.clear()
+    if disk:
+        disk_cache = ext.utils.disk_cache.get_disk_cache()
+        if disk_cache is not None:
+            disk_cache.clear()
+
+
+def utility_scenarios(ext, server, args):
+    images = ext.utils.images
+    fetch = ext.utils.fetch
+    encode = ext.utils.encode
+    ids = server.ids()[:args.results]
+    results = []
+
+    def load_all(**kwargs):
+        fetch.map_ordered(lambda image_id: images.load_image(image_id, **kwargs), ids)
+
+    # A fresh loop per call, like ComfyUI's prompt worker; the aiohttp session
+    # lives on aio's own client loop, so it is still reused across calls
+    def load_all_async(**kwargs):
+        asyncio.run(fetch.map_ordered_async(
+            lambda image_id: images.load_image_async(image_id, **kwargs), ids))
+
+    results.append(run_scenario(f"load {len(ids)} (cold)", load_all, len(ids), args.iterations,
+                                setup=lambda: reset_caches(ext, disk=True)))
+    results.append(run_scenario(f"load {len(ids)} async (cold)", load_all_async, len(ids), args.iterations,
+                                setup=lambda: reset_caches(ext, disk=True)))
+    asyncio.run(ext.utils.aio.close_session())
+    results.append(run_scenario(f"load {len(ids)} (disk cache)", load_all, len(ids), args.iterations,
+                                setup=lambda: reset_caches(ext)))
+    results.append(run_scenario(f"load {len(ids)} (memory cache)", load_all, len(ids), args.iterations))
+    results.append(run_scenario(
+        f"load {len(ids)} max_resolution=1024 (cold)",
+        lambda: load_all(max_resolution=1024), len(ids), args.iterations,
+        setup=lambda: reset_caches(ext, disk=True)))
+    results.append(run_scenario(
+        f"load {len(ids)} thumbnails (cold)",
+        lambda: load_all(resolution="thumbnail"), len(ids), args.iterations,
+        setup=lambda: reset_caches(ext, disk=True)))
+
+    import torch
+    batch = torch.rand((args.upload_batch, 1024, 1024, 3))
+    for fmt, level in (("png", 4), ("png", 1), ("webp_lossless", 0)):
+        results.append(run_scenario(
+            f"encode {args.upload_batch}x1024^2 {fmt} level {level}",
+            lambda fmt=fmt, level=level: encode.encode_batch(batch, fmt, level),
+            args.upload_batch, args.iterations))
+
+    index = ext.utils.vector_index
+    index.sync_index(full=True)
+    local = index.get_index()
+    queries = server.embeddings[1:args.queries + 1]
+    results.append(run_scenario(f"local index top-10 x{len(queries)}",
+                                lambda: local.search(queries, k=10), len(queries), args.iterations))
+    return results
+
+
+def node_scenarios(ext, server, args):
+    import torch
+    find_similar = importlib.import_module("embeddr_nodes.EmbeddrFindSimilar").EmbeddrFindSimilarNode
+    find_text = importlib.import_module("embeddr_nodes.EmbeddrFindSimilarText").EmbeddrFindSimilarTextNode
+    load_one = importlib.import_module("embeddr_nodes.EmbeddrLoadImage").EmbeddrLoadImageNode
+    load_many = importlib.import_module("embeddr_nodes.EmbeddrLoadImages").EmbeddrLoadImagesNode
+    upload = importlib.import_module("embeddr_nodes.EmbeddrUploadImage").EmbeddrSaveToFolderNode
+
+    # execute() is async on these nodes; each call gets its own asyncio.run, as in ComfyUI
+    def run(execute):
+        return lambda: asyncio.run(execute())
+
+    query = torch.rand((1, 512, 512, 3))
+    limit = min(args.results, 50)
+    cold = lambda: reset_caches(ext, disk=True)
+    results = [
+        run_scenario("LoadImage (cold)", run(lambda: load_one.execute("1")), 1, args.iterations, setup=cold),
+        run_scenario(f"LoadImages list limit={args.results} (cold)",
+                     run(lambda: load_many.execute("All", "All", "newest", args.results, 0)),
+                     args.results, args.iterations, setup=cold),
+        run_scenario(f"LoadImages batch limit={args.results} (cold)",
+                     run(lambda: load_many.execute("All", "All", "newest", args.results, 0,
+                                                   output_mode="batch")),
+                     args.results, args.iterations, setup=cold),
+        run_scenario(f"FindSimilar limit={limit} (cold)",
+                     run(lambda: find_similar.execute(query, limit=limit)),
+                     limit, args.iterations, setup=cold),
+        run_scenario(f"FindSimilar limit={limit} (repeat query)",
+                     run(lambda: find_similar.execute(query, limit=limit)),
+                     limit, args.iterations),
+        run_scenario(f"FindSimilarText limit={limit} (cold)",
+                     run(lambda: find_text.execute("a photo", limit=limit)),
+                     limit, args.iterations, setup=cold),
+        run_scenario(f"Upload batch of {args.upload_batch}",
+                     run(lambda: upload.execute(torch.rand((args.upload_batch, 1024, 1024, 3)))),
+                     args.upload_batch, args.iterations),
+    ]
+    asyncio.run(ext.utils.aio.close_session())
+    return results
+
+
+def print_table(results):
+    header = f"{'scenario':<48} {'items/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(f"{row['scenario']:<48} {row['items_per_s']:>10.1f} {row['p50_ms']:>10.1f} "
+              f"{row['p99_ms']:>10.1f} {row['peak_rss_mb']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--comfyui", help="ComfyUI checkout to import comfy_api/folder_paths from; enables node benchmarks")
+    parser.add_argument("--images", type=int, default=200, help="images served by the fake server")
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--height", type=int, default=1536)
+    parser.add_argument("--results", type=int, default=50, help="result count for load/search scenarios")
+    parser.add_argument("--queries", type=int, default=100, help="queries for the local index scenario")
+    parser.add_argument("--upload-batch", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency added to every fake server response")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    if args.comfyui:
+        sys.path.insert(0, os.path.abspath(os.path.expanduser(args.comfyui)))
+
+    ext = import_extension()
+    for name in ("config", "cache", "catalog", "disk_cache", "encode", "fetch", "images", "vector_index"):
+        importlib.import_module(f"embeddr_nodes.utils.{name}")
+    ext.utils = sys.modules["embeddr_nodes.utils"]
+
+    with tempfile.TemporaryDirectory(prefix="embeddr-bench-") as workdir, \
+            FakeEmbeddrServer(args.images, args.width, args.height, latency_ms=args.latency_ms) as server:
+        overrides = {}
+        if args.comfyui:
+            import folder_paths
+            folder_paths.set_output_directory(os.path.join(workdir, "output"))
+        configure(ext, server, workdir, overrides)
+
+        results = utility_scenarios(ext, server, args)
+        if args.comfyui:
+            results += node_scenarios(ext, server, args)
+        else:
+            print("[bench] --comfyui not given; skipping node execute() scenarios\n")
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
-import requests
 import torch
-import numpy as np
-from PIL import Image
-import io as pyio
 from comfy_api.latest import io, ui
+from .utils.metrics import timed_node
 from .utils import get_config
-from .utils.api import get_libraries, get_collections
+from .utils.catalog import get_libraries, get_collections
+from .utils import aio
+from .utils.cache import get_search_cache, tensor_digest
+from .utils.changes import listing_fingerprint
+from .utils.encode import encode_image, to_uint8
+from .utils.fetch import map_ordered_async
+from .utils.images import load_image_async, FIT_MODES, RESOLUTIONS
 
 
 class EmbeddrFindSimilarNode(io.ComfyNode):
@@ -28,28 +31,58 @@ class EmbeddrFindSimilarNode(io.ComfyNode):
                 io.Int.Input("limit", default=5, min=1, max=50),
                 io.Float.Input("threshold", default=0.0, min=0.0,
                                max=1.0, step=0.01, display_name="Min Score"),
+                io.Int.Input("max_resolution", default=0, min=0, max=16384, step=8,
+                             display_name="Max Resolution",
+                             tooltip="Downscale loaded images so the fit side is at most this many pixels. 0 keeps the original size."),
+                io.Combo.Input("fit", options=FIT_MODES, default="longest_side"),
+                io.Combo.Input("resolution", options=RESOLUTIONS, default="original",
+                               tooltip="thumbnail uses the server's preview; max_edge fetches the smallest rendition covering Max Resolution."),
+                io.Combo.Input("queries", options=["all", "first"], default="all",
+                               tooltip="Search with every image in the batch, or only the first."),
             ],
             outputs=[
                 io.Image.Output("images", is_output_list=True),
                 io.String.Output("embeddr_ids", is_output_list=True),
+                io.Int.Output("query_index", is_output_list=True),
             ],
         )
 
     @classmethod
-    def execute(cls, image, library="All", collection="All", limit=5, threshold=0.0):
-        config = get_config()
-        endpoint = config.get("endpoint", "http://localhost:8003")
-        api_url = endpoint.rstrip("/") + "/api/v1/images/search/image"
+    def fingerprint_inputs(cls, image, library="All", collection="All", limit=5, threshold=0.0, max_resolution=0, fit="longest_side", resolution="original", queries="all"):
+        # The linked image arrives as None here; ComfyUI's own cache already
+        # re-runs the node when it changes, so only widgets and the listing count
+        return (library, collection, limit, threshold, max_resolution, fit, resolution, queries,
+                listing_fingerprint(library, collection))
 
-        # Prepare image (take first of batch)
-        img_array = (image[0].cpu().numpy() * 255).astype(np.uint8)
-        img = Image.fromarray(np.clip(img_array, 0, 255))
+    @classmethod
+    async def _search(cls, query, data, cache_key, config):
+        """Run one image query, returning the list of hit IDs."""
+        search_cache = get_search_cache(config)
+        # Hashing, like encoding, is a full pass over the pixels; both stay off the loop
+        cache_key = cache_key + (await aio.run_sync(tensor_digest, query),)
+        item_ids = search_cache.get(cache_key) if search_cache is not None else None
+        if item_ids is not None:
+            return item_ids
+
+        # Fast PNG: the server decodes it once, so size barely matters
+        content, mime, ext = await aio.run_sync(
+            lambda: encode_image(to_uint8(query[None])[0], "png", 1))
+        files = {"file": (f"image.{ext}", content, mime)}
+
+        response = await aio.api_post("images/search/image", config=config,
+                                      data=aio.form_data(data, files))
+        response.raise_for_status()
+        results = response.json()
+        item_ids = [item['id'] for item in results.get("items", [])]
+        if search_cache is not None:
+            search_cache.put(cache_key, item_ids)
+        return item_ids
 
-        buf = pyio.BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
+    @classmethod
+    @timed_node("embeddr.FindSimilar")
+    async def execute(cls, image, library="All", collection="All", limit=5, threshold=0.0, max_resolution=0, fit="longest_side", resolution="original", queries="all"):
+        config = get_config()
 
-        files = {"file": ("image.png", buf, "image/png")}
         data = {
             "limit": limit,
         }
@@ -70,42 +103,51 @@ class EmbeddrFindSimilarNode(io.ComfyNode):
                 pass
 
         try:
-            response = requests.post(api_url, files=files, data=data)
-            response.raise_for_status()
-            results = response.json()
-            items = results.get("items", [])
-
-            if not items:
-                # Return empty
-                empty = torch.zeros(
-                    (1, 64, 64, 3), dtype=torch.float32, device="cpu")
-                return io.NodeOutput(empty, "[]")
-
-            # Load images
+            batch_size = image.shape[0] if queries == "all" else 1
+            fingerprint = await aio.run_sync(listing_fingerprint, library, collection, config)
+            cache_key = ("image-search", library, collection, limit, fingerprint)
+
+            # One search per batch image, run concurrently; a failed query yields no hits
+            hits = await map_ordered_async(lambda index: cls._search(image[index], data, cache_key, config),
+                               range(batch_size), config=config, label="query")
+            hits = [item_ids or [] for item_ids in hits]
+
+            if not any(hits):
+                return cls._return_empty()
+
+            # Load each distinct hit once, even when several queries return it
+            unique_ids = list(dict.fromkeys(
+                image_id for item_ids in hits for image_id in item_ids))
+
+            async def load(image_id):
+                image, _ = await load_image_async(image_id, config, max_resolution, fit, resolution)
+                return image
+
+            loaded = dict(zip(unique_ids, await map_ordered_async(
+                load, unique_ids, config=config, label="image")))
+
+            # Outputs stay grouped by query, in batch order
             output_images = []
             output_ids = []
-
-            for item in items:
-                # Fetch image file
-                img_url = endpoint.rstrip(
-                    "/") + f"/api/v1/images/{item['id']}/file"
-                img_resp = requests.get(img_url)
-                if img_resp.status_code == 200:
-                    i = Image.open(pyio.BytesIO(img_resp.content))
-                    i = i.convert("RGB")
-                    i = np.array(i).astype(np.float32) / 255.0
-                    output_images.append(torch.from_numpy(i))
-                    output_ids.append(str(item['id']))
+            output_queries = []
+            for query_index, item_ids in enumerate(hits):
+                for image_id in item_ids:
+                    if loaded.get(image_id) is not None:
+                        output_images.append(loaded[image_id])
+                        output_ids.append(str(image_id))
+                        output_queries.append(query_index)
 
             if not output_images:
-                return io.NodeOutput([], [])
+                return io.NodeOutput([], [], [])
 
-            # Return list of images (unsqueeze to add batch dimension 1)
-            final_images = [img.unsqueeze(0) for img in output_images]
-            return io.NodeOutput(final_images, output_ids)
+            return io.NodeOutput(output_images, output_ids, output_queries)
 
         except Exception as e:
             print(f"[Embeddr] Search failed: {e}")
-            empty = torch.zeros(
-                (1, 64, 64, 3), dtype=torch.float32, device="cpu")
-            return io.NodeOutput(empty, "[]")
+            return cls._return_empty()
+
+    @staticmethod
+    def _return_empty():
+        empty = torch.zeros(
+            (1, 64, 64, 3), dtype=torch.float32, device="cpu")
+        return io.NodeOutput(empty, "[]", [])
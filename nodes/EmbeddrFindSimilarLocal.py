@@ -0,0 +1,116 @@
+import torch
+from comfy_api.latest import io, ui
+from .utils.metrics import timed_node
+from .utils import get_config
+from .utils.catalog import get_libraries, get_collections
+from .utils.fetch import map_ordered
+from .utils.images import load_image, FIT_MODES
+from .utils.vector_index import ensure_synced
+
+
+class EmbeddrFindSimilarLocalNode(io.ComfyNode):
+    @classmethod
+    def define_schema(cls) -> io.Schema:
+        # Fetch dynamic options
+        libraries = ["All"] + get_libraries()
+        collections = ["All"] + get_collections()
+
+        return io.Schema(
+            node_id="embeddr.FindSimilarLocal",
+            display_name="Embeddr Find Similar (Local Index)",
+            description="Finds images similar to existing Embeddr images using a local mirror of the embedding index.",
+            category="Embeddr",
+            inputs=[
+                io.String.Input("image_ids", default="",
+                                tooltip="Comma separated Embeddr IDs to use as queries."),
+                io.Combo.Input("library", options=libraries, default="All"),
+                io.Combo.Input(
+                    "collection", options=collections, default="All"),
+                io.Int.Input("limit", default=5, min=1, max=500),
+                io.Int.Input("max_resolution", default=0, min=0, max=16384, step=8,
+                             display_name="Max Resolution",
+                             tooltip="Downscale loaded images so the fit side is at most this many pixels. 0 keeps the original size."),
+                io.Combo.Input("fit", options=FIT_MODES, default="longest_side"),
+                io.Boolean.Input("load_images", default=True,
+                                 tooltip="Turn off to only output IDs and scores."),
+            ],
+            outputs=[
+                io.Image.Output("images", is_output_list=True),
+                io.String.Output("embeddr_ids", is_output_list=True),
+                io.Float.Output("scores", is_output_list=True),
+                io.Int.Output("query_index", is_output_list=True),
+            ],
+        )
+
+    @classmethod
+    @timed_node("embeddr.FindSimilarLocal")
+    def execute(cls, image_ids, library="All", collection="All", limit=5, max_resolution=0, fit="longest_side", load_images=True):
+        config = get_config()
+
+        if isinstance(image_ids, list):
+            image_ids = ",".join(map(str, image_ids))
+        query_ids = []
+        for image_id in str(image_ids).split(","):
+            try:
+                query_ids.append(int(image_id.strip()))
+            except ValueError:
+                pass
+        if not query_ids:
+            return io.NodeOutput([], [], [], [])
+
+        # Parse IDs from "ID: Name" format
+        library_id = None
+        if library != "All":
+            try:
+                library_id = int(library.split(":")[0])
+            except:
+                pass
+
+        collection_id = None
+        if collection != "All":
+            try:
+                collection_id = int(collection.split(":")[0])
+            except:
+                pass
+
+        try:
+            index = ensure_synced(library_id, collection_id, config)
+
+            found = [(query_index, index.vector(image_id))
+                     for query_index, image_id in enumerate(query_ids)]
+            found = [(query_index, vector) for query_index, vector in found if vector is not None]
+            if not found:
+                print("[Embeddr] None of the query IDs are in the local index")
+                return io.NodeOutput([], [], [], [])
+
+            # All queries scored in one vectorised pass
+            results = index.search([vector for _, vector in found], k=limit,
+                                   exclude_self=[query_ids[query_index] for query_index, _ in found])
+
+            hits = [(query_index, image_id, score)
+                    for (query_index, _), query_hits in zip(found, results)
+                    for image_id, score in query_hits]
+
+            loaded = {}
+            if load_images:
+                # Load each distinct hit once, even when several queries return it
+                unique_ids = list(dict.fromkeys(image_id for _, image_id, _ in hits))
+                loaded = dict(zip(unique_ids, map_ordered(
+                    lambda image_id: load_image(image_id, config, max_resolution, fit)[0],
+                    unique_ids, config=config, label="image")))
+
+            output_images, output_ids, output_scores, output_queries = [], [], [], []
+            for query_index, image_id, score in hits:
+                if load_images:
+                    if loaded.get(image_id) is None:
+                        continue
+                    output_images.append(loaded[image_id])
+                output_ids.append(str(image_id))
+                output_scores.append(score)
+                output_queries.append(query_index)
+
+            return io.NodeOutput(output_images, output_ids, output_scores, output_queries)
+
+        except Exception as e:
+            print(f"[Embeddr] Local search failed: {e}")
+            return io.NodeOutput([], [], [], [])
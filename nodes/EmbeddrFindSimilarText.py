@@ -1,11 +1,14 @@
-import requests
 import torch
 import numpy as np
-from PIL import Image, ImageOps
-import io as pyio
 from comfy_api.latest import io, ui
+from .utils.metrics import timed_node
 from .utils import get_config
-from .utils.api import get_libraries, get_collections
+from .utils.catalog import get_libraries, get_collections
+from .utils import aio
+from .utils.cache import get_search_cache
+from .utils.changes import listing_fingerprint
+from .utils.fetch import map_ordered_async
+from .utils.images import load_image_async, FIT_MODES, RESOLUTIONS
 
 
 class EmbeddrFindSimilarTextNode(io.ComfyNode):
@@ -26,6 +29,12 @@ class EmbeddrFindSimilarTextNode(io.ComfyNode):
                 io.Combo.Input(
                     "collection", options=collections, default="All"),
                 io.Int.Input("limit", default=5, min=1, max=50),
+                io.Int.Input("max_resolution", default=0, min=0, max=16384, step=8,
+                             display_name="Max Resolution",
+                             tooltip="Downscale loaded images so the fit side is at most this many pixels. 0 keeps the original size."),
+                io.Combo.Input("fit", options=FIT_MODES, default="longest_side"),
+                io.Combo.Input("resolution", options=RESOLUTIONS, default="original",
+                               tooltip="thumbnail uses the server's preview; max_edge fetches the smallest rendition covering Max Resolution."),
             ],
             outputs=[
                 io.Image.Output("images", is_output_list=True),
@@ -34,10 +43,14 @@ class EmbeddrFindSimilarTextNode(io.ComfyNode):
         )
 
     @classmethod
-    def execute(cls, prompt, library="All", collection="All", limit=5):
+    def fingerprint_inputs(cls, prompt, library="All", collection="All", limit=5, max_resolution=0, fit="longest_side", resolution="original"):
+        return (prompt, library, collection, limit, max_resolution, fit, resolution,
+                listing_fingerprint(library, collection))
+
+    @classmethod
+    @timed_node("embeddr.FindSimilarText")
+    async def execute(cls, prompt, library="All", collection="All", limit=5, max_resolution=0, fit="longest_side", resolution="original"):
         config = get_config()
-        endpoint = config.get("endpoint", "http://localhost:8003")
-        api_url = endpoint.rstrip("/") + "/api/v1/images"
 
         params = {
             "q": prompt,
@@ -60,12 +73,20 @@ class EmbeddrFindSimilarTextNode(io.ComfyNode):
                 pass
 
         try:
-            response = requests.get(api_url, params=params)
-            response.raise_for_status()
-            results = response.json()
-            items = results.get("items", [])
-
-            if not items:
+            search_cache = get_search_cache(config)
+            fingerprint = await aio.run_sync(listing_fingerprint, library, collection, config)
+            cache_key = ("text-search", prompt, library, collection, limit, fingerprint)
+            item_ids = search_cache.get(cache_key) if search_cache is not None else None
+
+            if item_ids is None:
+                response = await aio.api_get("images", config=config, params=params)
+                response.raise_for_status()
+                results = response.json()
+                item_ids = [item['id'] for item in results.get("items", [])]
+                if search_cache is not None:
+                    search_cache.put(cache_key, item_ids)
+
+            if not item_ids:
                 # Return empty
                 empty = torch.zeros(
                     (1, 64, 64, 3), dtype=torch.float32, device="cpu")
@@ -75,23 +96,15 @@ class EmbeddrFindSimilarTextNode(io.ComfyNode):
             output_images = []
             output_ids = []
 
-            first_width = 0
-            first_height = 0
-
-            for item in items:
-                # Fetch image file
-                img_url = endpoint.rstrip(
-                    "/") + f"/api/v1/images/{item['id']}/file"
-                img_resp = requests.get(img_url)
-                if img_resp.status_code == 200:
-                    i = Image.open(pyio.BytesIO(img_resp.content))
-                    i = ImageOps.exif_transpose(i)
-
-                    i = i.convert("RGB")
-                    i = np.array(i).astype(np.float32) / 255.0
-                    # Add batch dimension (1, H, W, C)
-                    output_images.append(torch.from_numpy(i).unsqueeze(0))
-                    output_ids.append(str(item['id']))
+            async def load(image_id):
+                image, _ = await load_image_async(image_id, config, max_resolution, fit, resolution)
+                return image
+
+            loaded = await map_ordered_async(load, item_ids, config=config, label="image")
+            for image_id, i in zip(item_ids, loaded):
+                if i is not None:
+                    output_images.append(i)
+                    output_ids.append(str(image_id))
 
             if not output_images:
                 return io.NodeOutput([], [])
@@ -1,15 +1,10 @@
-import requests
 import torch
-import numpy as np
-from PIL import Image, ImageOps
-from io import BytesIO
 from comfy_api.latest import io, ui
-from .utils import get_config
+from .utils.metrics import timed_node
+from .utils.images import load_image_async, FIT_MODES
 
 
 class EmbeddrLoadImageNode(io.ComfyNode):
-    _cache = {}
-
     @classmethod
     def define_schema(cls) -> io.Schema:
         return io.Schema(
@@ -19,6 +14,10 @@ class EmbeddrLoadImageNode(io.ComfyNode):
             category="Embeddr",
             inputs=[
                 io.String.Input("image_id", default=""),
+                io.Int.Input("max_resolution", default=0, min=0, max=16384, step=8,
+                             display_name="Max Resolution",
+                             tooltip="Downscale loaded images so the fit side is at most this many pixels. 0 keeps the original size."),
+                io.Combo.Input("fit", options=FIT_MODES, default="longest_side"),
             ],
             outputs=[
                 io.Image.Output("image"),
@@ -28,7 +27,8 @@ class EmbeddrLoadImageNode(io.ComfyNode):
         )
 
     @classmethod
-    def execute(cls, image_id):
+    @timed_node("embeddr.LoadImage")
+    async def execute(cls, image_id, max_resolution=0, fit="longest_side"):
         if not image_id:
             # Return empty black image if no ID
             empty_image = torch.zeros(
@@ -37,33 +37,10 @@ class EmbeddrLoadImageNode(io.ComfyNode):
                 (1, 64, 64), dtype=torch.float32, device="cpu")
             return io.NodeOutput(empty_image, empty_mask, "")
 
-        if image_id in cls._cache:
-            image, mask = cls._cache[image_id]
-            return io.NodeOutput(image, mask, image_id)
-
         try:
-            config = get_config()
-            endpoint = config.get("endpoint", "http://localhost:8003")
-            # Ensure endpoint doesn't end with slash
-            endpoint = endpoint.rstrip("/")
-            api_url = f"{endpoint}/api/v1/images/{image_id}/file"
-
-            response = requests.get(api_url)
-            response.raise_for_status()
-            img = Image.open(BytesIO(response.content))
-
-            img = ImageOps.exif_transpose(img)
-            image = img.convert("RGB")
-            image = np.array(image).astype(np.float32) / 255.0
-            image = torch.from_numpy(image)[None,]
-
-            if 'A' in img.getbands():
-                mask = np.array(img.getchannel('A')).astype(np.float32) / 255.0
-                mask = 1. - torch.from_numpy(mask)
-            else:
-                mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
+            image, mask = await load_image_async(
+                image_id, max_resolution=max_resolution, fit=fit)
 
-            cls._cache[image_id] = (image, mask)
             return io.NodeOutput(image, mask, image_id, ui=ui.PreviewImage(image))
 
         except Exception as e:
@@ -1,17 +1,17 @@
-import requests
 import torch
-import numpy as np
-from PIL import Image, ImageOps
-from io import BytesIO
 import random
 from comfy_api.latest import io, ui
+from .utils.metrics import timed_node
 from .utils import get_config
-from .utils.api import get_collections, get_libraries
+from .utils.catalog import get_collections, get_libraries
+from .utils import aio
+from .utils.cache import get_image_cache
+from .utils.changes import listing_fingerprint
+from .utils.fetch import map_ordered_async
+from .utils.images import load_raw_image_async, to_output, build_batch, FIT_MODES, BATCH_POLICIES
 
 
 class EmbeddrLoadImagesNode(io.ComfyNode):
-    _cache = {}
-
     @classmethod
     def define_schema(cls) -> io.Schema:
         collections = ["All"] + get_collections()
@@ -31,25 +31,48 @@ class EmbeddrLoadImagesNode(io.ComfyNode):
                 io.Int.Input("limit", default=5, min=1, max=100),
                 io.Int.Input("seed", default=0,
                              display_name="Seed (Random Sort)"),
+                io.Int.Input("max_resolution", default=0, min=0, max=16384, step=8,
+                             display_name="Max Resolution",
+                             tooltip="Downscale loaded images so the fit side is at most this many pixels. 0 keeps the original size."),
+                io.Combo.Input("fit", options=FIT_MODES, default="longest_side"),
+                io.Combo.Input("output_mode", options=["list", "batch"], default="list",
+                               tooltip="batch also fills image_batch/mask_batch with a single [N,H,W,C] tensor; in list mode they are empty."),
+                io.Combo.Input("batch_policy", options=BATCH_POLICIES, default="resize",
+                               tooltip="How mismatched sizes are combined in batch mode."),
             ],
             outputs=[
                 io.Image.Output("images", is_output_list=True),
                 io.String.Output("embeddr_ids", is_output_list=True),
                 io.Mask.Output("masks", is_output_list=True),
+                io.Image.Output("image_batch",
+                                tooltip="All images as one tensor. Only filled when output_mode is batch; empty (0 images) otherwise."),
+                io.Mask.Output("mask_batch",
+                               tooltip="Masks matching image_batch. Only filled when output_mode is batch; empty (0 masks) otherwise."),
             ],
         )
 
     @classmethod
-    def execute(cls, library, collection, sort_by, limit, seed):
-        # Cache key based on inputs
-        cache_key = (library, collection, sort_by, limit, seed)
-        if cache_key in cls._cache:
-            return cls._cache[cache_key]
+    def fingerprint_inputs(cls, library, collection, sort_by, limit, seed, max_resolution=0, fit="longest_side", output_mode="list", batch_policy="resize"):
+        # Re-runs only when the inputs or the listing on the server change
+        return (library, collection, sort_by, limit, seed, max_resolution, fit, output_mode, batch_policy,
+                listing_fingerprint(library, collection))
 
+    @classmethod
+    @timed_node("embeddr.EmbeddrLoadImages")
+    async def execute(cls, library, collection, sort_by, limit, seed, max_resolution=0, fit="longest_side", output_mode="list", batch_policy="resize"):
         try:
             config = get_config()
-            endpoint = config.get("endpoint", "http://localhost:8003")
-            api_base_url = endpoint.rstrip("/") + "/api/v1"
+            cache = get_image_cache(config)
+
+            # The listing is cached as IDs only; the decoded images live in the
+            # shared per-image cache so identical files are never held twice.
+            # The change fingerprint in the key retires the listing once the
+            # library/collection changes on the server.
+            fingerprint = await aio.run_sync(listing_fingerprint, library, collection, config)
+            cache_key = ("listing", library, collection, sort_by, limit, seed, fingerprint)
+            item_ids = cache.get(cache_key) if fingerprint is not None else None
+            if item_ids is not None:
+                return await cls._load_ids(item_ids, config, max_resolution, fit, output_mode, batch_policy)
 
             params = {
                 "limit": limit,
@@ -81,8 +104,7 @@ class EmbeddrLoadImagesNode(io.ComfyNode):
                 params["sort"] = "new"
 
             # Fetch images
-            url = f"{api_base_url}/images"
-            response = requests.get(url, params=params)
+            response = await aio.api_get("images", config=config, params=params)
             response.raise_for_status()
             data = response.json()
             items = data.get("items", [])
@@ -90,56 +112,69 @@ class EmbeddrLoadImagesNode(io.ComfyNode):
             if not items:
                 return cls._return_empty()
 
-            images_list = []
-            masks_list = []
-            ids_list = []
-
-            for item in items:
-                image_id = item.get("id")
-                if not image_id:
-                    continue
-
-                image_url = f"{api_base_url}/images/{image_id}/file"
-
-                try:
-                    img_resp = requests.get(image_url)
-                    img_resp.raise_for_status()
-                    img = Image.open(BytesIO(img_resp.content))
-                    img = ImageOps.exif_transpose(img)
-
-                    image = img.convert("RGB")
-                    image_np = np.array(image).astype(np.float32) / 255.0
-                    # Add batch dimension: [1, H, W, C]
-                    image_tensor = torch.from_numpy(image_np).unsqueeze(0)
-
-                    if 'A' in img.getbands():
-                        mask_np = np.array(img.getchannel(
-                            'A')).astype(np.float32) / 255.0
-                        mask_tensor = 1. - torch.from_numpy(mask_np)
-                        mask_tensor = mask_tensor.unsqueeze(0)  # [1, H, W]
-                    else:
-                        mask_tensor = torch.zeros(
-                            (1, img.height, img.width), dtype=torch.float32, device="cpu")
-
-                    images_list.append(image_tensor)
-                    masks_list.append(mask_tensor)
-                    ids_list.append(str(image_id))
-                except Exception as e:
-                    print(f"[Embeddr] Failed to load image {image_id}: {e}")
-                    continue
-
-            if not images_list:
-                return cls._return_empty()
-
-            # Return lists
-            result = io.NodeOutput(images_list, ids_list, masks_list)
-            cls._cache[cache_key] = result
+            item_ids = [item.get("id") for item in items if item.get("id")]
+            result = await cls._load_ids(item_ids, config, max_resolution, fit, output_mode, batch_policy)
+            cache.put(cache_key, item_ids)
             return result
 
         except Exception as e:
             print(f"[Embeddr] Error loading images: {e}")
             return cls._return_empty()
 
+    @classmethod
+    async def _load_ids(cls, item_ids, config, max_resolution=0, fit="longest_side", output_mode="list", batch_policy="resize"):
+        images_list = []
+        masks_list = []
+        ids_list = []
+
+        # Downloads overlap with decodes of images that already arrived. Cached
+        # images are uint8; they become float32 only here, on the way out.
+        loaded = await map_ordered_async(lambda image_id: load_raw_image_async(image_id, config, max_resolution, fit),
+                             item_ids, config=config, label="image")
+        if output_mode == "batch":
+            return await cls._load_batch(item_ids, loaded, batch_policy)
+
+        pairs = [(image_id, result) for image_id, result in zip(item_ids, loaded)
+                 if result is not None]
+        # float32 conversion is a full pass over every pixel; keep it off the loop
+        outputs = await aio.run_sync(lambda: [to_output(result) for _, result in pairs])
+        for (image_id, _), (image_tensor, mask_tensor) in zip(pairs, outputs):
+            images_list.append(image_tensor)
+            masks_list.append(mask_tensor)
+            ids_list.append(str(image_id))
+
+        if not images_list:
+            return cls._return_empty()
+
+        # Return lists
+        empty_image, empty_mask = cls._empty_batch()
+        return io.NodeOutput(images_list, ids_list, masks_list, empty_image, empty_mask)
+
+    @classmethod
+    async def _load_batch(cls, item_ids, loaded, batch_policy):
+        pairs = [(str(image_id), result) for image_id, result in zip(item_ids, loaded)
+                 if result is not None]
+        if not pairs:
+            return cls._return_empty()
+
+        ids_list = [image_id for image_id, _ in pairs]
+        batch, mask_batch = await aio.run_sync(build_batch,
+                                               [result[0] for _, result in pairs],
+                                               [result[1] for _, result in pairs],
+                                               batch_policy)
+        # List outputs are views into the batch, so nothing is stored twice
+        images_list = [batch[i:i + 1] for i in range(batch.shape[0])]
+        masks_list = [mask_batch[i:i + 1] for i in range(mask_batch.shape[0])]
+        return io.NodeOutput(images_list, ids_list, masks_list, batch, mask_batch)
+
     @staticmethod
-    def _return_empty():
-        return io.NodeOutput([], [], [])
+    def _empty_batch():
+        # Zero images rather than a placeholder, so a wired batch output in list
+        # mode can't silently feed a black image downstream
+        return (torch.zeros((0, 64, 64, 3), dtype=torch.float32, device="cpu"),
+                torch.zeros((0, 64, 64), dtype=torch.float32, device="cpu"))
+
+    @classmethod
+    def _return_empty(cls):
+        empty_image, empty_mask = cls._empty_batch()
+        return io.NodeOutput([], [], [], empty_image, empty_mask)
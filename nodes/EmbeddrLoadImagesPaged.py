@@ -0,0 +1,125 @@
+from comfy_api.latest import io, ui
+from .utils.metrics import timed_node
+from .utils import get_config
+from .utils.catalog import get_collections, get_libraries
+from .utils import aio
+from .utils.api import get_endpoint
+from .utils.fetch import map_ordered_async
+from .utils.images import load_image_async, FIT_MODES
+from .utils.progress import get_progress, save_progress
+
+
+class EmbeddrLoadImagesPagedNode(io.ComfyNode):
+    @classmethod
+    def define_schema(cls) -> io.Schema:
+        collections = ["All"] + get_collections()
+        libraries = ["All"] + get_libraries()
+
+        return io.Schema(
+            node_id="embeddr.EmbeddrLoadImagesPaged",
+            display_name="Embeddr Load Images (Paged)",
+            description="Walks a whole library or collection one page per queue run, newest first, remembering where it stopped. Images added mid-walk shift the pages, so a few already-seen images repeat.",
+            category="Embeddr",
+            inputs=[
+                io.Combo.Input("library", options=libraries, default="All"),
+                io.Combo.Input(
+                    "collection", options=collections, default="All"),
+                io.Int.Input("page_size", default=16, min=1, max=100),
+                io.String.Input("run_name", default="default",
+                                tooltip="Progress is saved per run name, library and collection."),
+                io.Boolean.Input("reset", default=False,
+                                 tooltip="Start again from the first page."),
+                io.Int.Input("max_resolution", default=0, min=0, max=16384, step=8,
+                             display_name="Max Resolution",
+                             tooltip="Downscale loaded images so the fit side is at most this many pixels. 0 keeps the original size."),
+                io.Combo.Input("fit", options=FIT_MODES, default="longest_side"),
+            ],
+            outputs=[
+                io.Image.Output("images", is_output_list=True),
+                io.String.Output("embeddr_ids", is_output_list=True),
+                io.Mask.Output("masks", is_output_list=True),
+                io.Int.Output("offset"),
+                io.Int.Output("total"),
+                io.Boolean.Output("done"),
+            ],
+        )
+
+    @classmethod
+    def _progress_key(cls, library, collection, run_name, config=None):
+        return f"{get_endpoint(config)}|{library}|{collection}|{run_name}"
+
+    @classmethod
+    def fingerprint_inputs(cls, library, collection, page_size, run_name, reset=False, max_resolution=0, fit="longest_side"):
+        # Changes whenever a run advances the saved position, so every queue run fetches the next page
+        state = get_progress(cls._progress_key(library, collection, run_name))
+        return (library, collection, page_size, run_name, reset, max_resolution, fit,
+                state.get("offset", 0), state.get("cursor"))
+
+    @classmethod
+    @timed_node("embeddr.EmbeddrLoadImagesPaged")
+    async def execute(cls, library, collection, page_size, run_name, reset=False, max_resolution=0, fit="longest_side"):
+        config = get_config()
+        key = cls._progress_key(library, collection, run_name, config)
+        state = {} if reset else await aio.run_sync(get_progress, key)
+        offset = state.get("offset", 0)
+
+        # The listing pages with skip=, like the UI's image browser; "new" is the
+        # only stable order the server offers
+        params = {
+            "limit": page_size,
+            "skip": offset,
+            "sort": "new",
+        }
+        # Servers that hand out cursors are followed by cursor; skip is the fallback
+        if state.get("cursor"):
+            params["cursor"] = state["cursor"]
+
+        # Parse Library ID
+        if library != "All":
+            try:
+                params["library_id"] = int(library.split(":")[0])
+            except:
+                pass
+
+        # Parse Collection ID
+        if collection != "All":
+            try:
+                params["collection_id"] = int(collection.split(":")[0])
+            except:
+                pass
+
+        try:
+            response = await aio.api_get("images", config=config, params=params)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            print(f"[Embeddr] Error loading page at {offset}: {e}")
+            return io.NodeOutput([], [], [], offset, state.get("total", 0), False)
+
+        items = data.get("items", [])
+        total = int(data.get("total", state.get("total", 0)) or 0)
+        item_ids = [item.get("id") for item in items if item.get("id")]
+
+        # Only this page is decoded, and it skips the shared cache so a long
+        # walk doesn't evict everything else
+        loaded = await map_ordered_async(
+            lambda image_id: load_image_async(image_id, config, max_resolution, fit, use_cache=False),
+            item_ids, config=config, label="image")
+
+        images_list, masks_list, ids_list = [], [], []
+        for image_id, result in zip(item_ids, loaded):
+            if result is None:
+                continue
+            image_tensor, mask_tensor = result
+            images_list.append(image_tensor)
+            masks_list.append(mask_tensor)
+            ids_list.append(str(image_id))
+
+        next_offset = offset + len(items)
+        next_cursor = data.get("next_cursor")
+        done = not items or len(items) < page_size or (total and next_offset >= total) \
+            or ("next_cursor" in data and not next_cursor)
+        await aio.run_sync(save_progress, key, {"offset": next_offset, "cursor": next_cursor,
+                                                "total": total, "done": bool(done)})
+
+        return io.NodeOutput(images_list, ids_list, masks_list, offset, total, bool(done))
@@ -1,4 +1,5 @@
 from comfy_api.latest import io, ui
+from .utils.metrics import timed_node
 
 
 class EmbeddrMergeIDsNode(io.ComfyNode):
@@ -17,6 +18,7 @@ class EmbeddrMergeIDsNode(io.ComfyNode):
         )
 
     @classmethod
+    @timed_node("embeddr.MergeIDs")
     def execute(cls, **kwargs):
         ids = []
         # Iterate through all possible inputs
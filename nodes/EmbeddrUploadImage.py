@@ -1,16 +1,17 @@
 import folder_paths
-from .utils.api import get_libraries, get_collections
+from .utils.catalog import get_libraries, get_collections
+from .utils import aio
 import os
 import json
-import requests
-import numpy as np
-from PIL import Image
-from PIL.PngImagePlugin import PngInfo
 from comfy_api.latest import io, ui
 from comfy_api.latest._io import _UIOutput, ComfyNode, FolderType
-import io as pyio
+from .utils.metrics import timed_node
 import random
 from .utils import get_config
+from .utils.encode import encode_batch, encode_image, add_png_text, to_uint8, UPLOAD_FORMATS
+from .utils import dedupe
+from .utils.fetch import map_ordered_async, get_concurrency, DEFAULT_UPLOAD_CONCURRENCY
+from .utils.spool import enqueue_bytes
 
 
 def Embeddr_Log(message: str):
@@ -58,6 +59,15 @@ class EmbeddrSaveToFolderNode(io.ComfyNode):
                                  display_name="Allow Duplicates"),
                 io.Boolean.Input("save_backup", default=False,
                                  display_name="Save to Comfy History"),
+                io.Combo.Input("upload_format", options=list(UPLOAD_FORMATS), default="png",
+                               display_name="Upload Format"),
+                io.Int.Input("compress_level", default=4, min=0, max=9,
+                             tooltip="PNG zlib level / WebP effort. Lower is faster."),
+                io.Int.Input("quality", default=95, min=1, max=100,
+                             tooltip="Quality for lossy WebP and JPEG."),
+                io.Boolean.Input("background_upload", default=False,
+                                 display_name="Upload in Background",
+                                 tooltip="Spool to disk and upload in the background. Outputs spool:<job> placeholders instead of Embeddr IDs."),
             ],
             outputs=[
                 # THIS IS KEY: output name must match
@@ -70,93 +80,171 @@ class EmbeddrSaveToFolderNode(io.ComfyNode):
         return True
 
     @classmethod
-    def execute(cls, image, caption=None, parent_ids=None, library="Default", collection="None", tags="", allow_duplicates=False, save_backup=False, **kwargs):
+    @timed_node("embeddr.SaveToFolder")
+    async def execute(cls, image, caption=None, parent_ids=None, library="Default", collection="None", tags="", allow_duplicates=False, save_backup=False, upload_format="png", compress_level=4, quality=95, background_upload=False, **kwargs):
         """
         image: input tensor(s) from previous node
         caption: optional string
         parent_ids: optional string (comma separated) or list of IDs
         Returns the backend ID in the outputs so Comfy history sees it.
         """
-        uploaded_ids = []
-
         config = get_config()
-        print("Loaded Config: ", config)
-        endpoint = config.get("endpoint", "http://localhost:8003")
-        api_base_url = endpoint.rstrip("/") + "/api/v1"
-        upload_url = f"{api_base_url}/images/upload"
-
-        # Loop over batch images
-        for i in range(image.shape[0]):
-            img_array = (image[i].cpu().numpy() * 255).astype(np.uint8)
-            img = Image.fromarray(np.clip(img_array, 0, 255))
-
-            # Save backup if requested
-            if save_backup:
-                try:
-                    output_dir = folder_paths.get_output_directory()
-                    filename_prefix = "Embeddr_Backup"
-                    full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(
-                        filename_prefix, output_dir, img.size[0], img.size[1])
-
-                    metadata = PngInfo()
-                    if caption:
-                        metadata.add_text("parameters", caption)
-
-                    file = f"{filename}_{counter:05}_.png"
-                    img.save(os.path.join(full_output_folder, file),
-                             pnginfo=metadata, compress_level=4)
-                except Exception as e:
-                    print(f"[Embeddr] Failed to save backup: {e}")
-
-            buf = pyio.BytesIO()
-            img.save(buf, format="PNG")
-            buf.seek(0)
-
-            files = {"file": ("image.png", buf, "image/png")}
-            data = {"prompt": caption or ""}
-
-            if allow_duplicates:
-                data["force"] = "true"
-
-            if tags:
-                data["tags"] = tags
-
-            if library != "Default":
-                try:
-                    data["library_id"] = int(library.split(":")[0])
-                except:
-                    pass
-
-            if parent_ids:
-                if isinstance(parent_ids, list):
-                    data["parent_ids"] = ",".join(map(str, parent_ids))
-                else:
-                    data["parent_ids"] = str(parent_ids)
 
+        # Images already uploaded with these exact settings are known by their
+        # pixel digest and skip encoding and transfer entirely
+        count = image.shape[0]
+        known_ids = [None] * count
+        pixel_keys = [None] * count
+        use_dedupe = not allow_duplicates and dedupe.enabled(config)
+        if use_dedupe:
+            # Hashing and the first index load are blocking, so both run on the executor
+            def match_pixels():
+                arrays = to_uint8(image)
+                for i in range(count):
+                    pixel_keys[i] = dedupe.pixel_key(arrays[i], upload_format, compress_level,
+                                                     quality, caption, library)
+                    known_ids[i] = dedupe.lookup("pixels", pixel_keys[i], config)
+
+            await aio.run_sync(match_pixels)
+
+        # Encode the rest across cores; PNG uploads also serve as the backup's pixels.
+        # Backups need every image, duplicates included.
+        pending = [i for i in range(count) if known_ids[i] is None or save_backup]
+        encoded = {}
+        if pending:
+            batch = image if len(pending) == count else image[pending]
+            encoded = dict(zip(pending, await aio.run_sync(lambda: encode_batch(
+                batch, upload_format, compress_level, quality, config=config))))
+
+        # Save backups if requested, off the loop: directory scans and file writes
+        if save_backup:
+            await aio.run_sync(cls._save_backups, image, encoded, caption)
+
+        data = {"prompt": caption or ""}
+
+        if allow_duplicates:
+            data["force"] = "true"
+
+        if tags:
+            data["tags"] = tags
+
+        if library != "Default":
             try:
-                response = requests.post(upload_url, files=files, data=data)
-                response.raise_for_status()
-                result = response.json()
-                uploaded_id = result.get("id")
-                uploaded_ids.append(str(uploaded_id))
-
-                # Add to collection if selected
-                if collection and collection != "None" and uploaded_id:
+                data["library_id"] = int(library.split(":")[0])
+            except:
+                pass
+
+        if parent_ids:
+            if isinstance(parent_ids, list):
+                data["parent_ids"] = ",".join(map(str, parent_ids))
+            else:
+                data["parent_ids"] = str(parent_ids)
+
+        collection_id = None
+        if collection and collection != "None":
+            try:
+                collection_id = int(collection.split(":")[0])
+            except:
+                pass
+
+        if background_upload:
+            # Spooling fsyncs every job, so it runs on the executor too
+            uploaded_ids = await aio.run_sync(
+                cls._spool, known_ids, encoded, data, collection_id, config)
+            preview = EmbeddrImage(image, uploaded_ids, cls=cls)
+            return io.NodeOutput(",".join(uploaded_ids), ui=preview)
+
+        learned = []
+
+        async def upload(i):
+            uploaded_id = known_ids[i]
+            if uploaded_id is None:
+                content, mime, ext = encoded[i]
+                # A different pixel key can still encode to a file the server already has
+                file_digest = await aio.run_sync(dedupe.file_key, content) if use_dedupe else None
+                if use_dedupe:
+                    uploaded_id = (await aio.run_sync(dedupe.lookup, "file", file_digest, config)
+                                   or await dedupe.check_server(file_digest, config))
+
+                if uploaded_id is None:
+                    files = {"file": (f"image.{ext}", content, mime)}
                     try:
-                        collection_id = int(collection.split(":")[0])
-                        requests.post(
-                            f"{api_base_url}/collections/{collection_id}/items",
-                            json={"image_id": uploaded_id}
-                        )
+                        response = await aio.upload("images/upload", data, files, config=config)
+                        response.raise_for_status()
+                        result = response.json()
+                        uploaded_id = result.get("id")
                     except Exception as e:
-                        print(f"[Embeddr] Failed to add to collection: {e}")
+                        print(f"[Embeddr] Upload failed: {e}")
+                        return "-1"
 
-            except Exception as e:
-                print(f"[Embeddr] Upload failed: {e}")
-                uploaded_ids.append("-1")
+                if use_dedupe and uploaded_id:
+                    learned.extend([("pixels", pixel_keys[i], uploaded_id),
+                                    ("file", file_digest, uploaded_id)])
+
+            # Add to collection right away so membership calls overlap with other uploads
+            if collection_id is not None and uploaded_id:
+                try:
+                    response = await aio.api_post(
+                        f"collections/{collection_id}/items",
+                        config=config,
+                        json={"image_id": uploaded_id}
+                    )
+                    response.raise_for_status()
+                except Exception as e:
+                    print(f"[Embeddr] Failed to add to collection: {e}")
+            return str(uploaded_id)
+
+        # Upload concurrently; results come back in batch order
+        uploaded_ids = await map_ordered_async(upload, range(count), config=config, label="upload",
+                                               workers=get_concurrency(config, "upload_concurrency", DEFAULT_UPLOAD_CONCURRENCY))
+        uploaded_ids = [uploaded_id or "-1" for uploaded_id in uploaded_ids]
+        if learned:
+            await aio.run_sync(dedupe.record, learned, config)
 
         # Create preview
         preview = EmbeddrImage(image, uploaded_ids, cls=cls)
 
         # Return IDs as comma-separated string
         return io.NodeOutput(",".join(uploaded_ids), ui=preview)
+
+    @staticmethod
+    def _save_backups(image, encoded, caption):
+        """
+        Backups are PNGs with the caption in their "parameters" text, as before
+        upload formats existed. The caption is spliced into the upload's PNG
+        bytes, so the uploaded file itself stays caption-free.
+        """
+        # Kept serial: the file counter comes from a directory scan
+        for i, (content, mime, ext) in encoded.items():
+            try:
+                if ext != "png":
+                    content, _, _ = encode_image(to_uint8(image[i:i + 1])[0], "png", 4)
+                if caption:
+                    content = add_png_text(content, "parameters", caption)
+                output_dir = folder_paths.get_output_directory()
+                filename_prefix = "Embeddr_Backup"
+                full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(
+                    filename_prefix, output_dir, image.shape[2], image.shape[1])
+
+                file = f"{filename}_{counter:05}_.png"
+                with open(os.path.join(full_output_folder, file), "wb") as f:
+                    f.write(content)
+            except Exception as e:
+                print(f"[Embeddr] Failed to save backup: {e}")
+
+    @staticmethod
+    def _spool(known_ids, encoded, data, collection_id, config):
+        """Spool every image not already known; returns spool:<job> placeholders in batch order."""
+        uploaded_ids = []
+        for i, known_id in enumerate(known_ids):
+            if known_id is not None:
+                uploaded_ids.append(known_id)
+                continue
+            content, mime, ext = encoded[i]
+            try:
+                uploaded_ids.append(enqueue_bytes(
+                    content, f"image.{ext}", mime, data, collection_id, config=config))
+            except Exception as e:
+                print(f"[Embeddr] Failed to spool upload: {e}")
+                uploaded_ids.append("-1")
+        return uploaded_ids
@@ -1,12 +1,16 @@
 import folder_paths
-from .utils.api import get_libraries, get_collections
+from .utils.catalog import get_libraries, get_collections
+from .utils.api import api_post
 import os
 import json
-import requests
 import tempfile
 from comfy_api.latest import io, ui
 from comfy_api.latest._io import ComfyNode
+from .utils.metrics import timed_node
 from .utils import get_config
+from .utils.spool import enqueue_file
+from .utils.upload import (stream_upload, upload_file, connect_failed,
+                           StreamProducerError, STREAMABLE_FORMATS)
 
 
 class EmbeddrUploadVideo(io.ComfyNode):
@@ -39,6 +43,9 @@ class EmbeddrUploadVideo(io.ComfyNode):
                                  display_name="Allow Duplicates"),
                 io.Boolean.Input("save_backup", default=False,
                                  display_name="Save to Comfy History"),
+                io.Boolean.Input("background_upload", default=False,
+                                 display_name="Upload in Background",
+                                 tooltip="Spool to disk and upload in the background. Outputs a spool:<job> placeholder instead of an Embeddr ID."),
             ],
             outputs=[
                 io.String.Output("embeddr_id"),
@@ -50,14 +57,52 @@ class EmbeddrUploadVideo(io.ComfyNode):
         return True
 
     @classmethod
-    def execute(cls, video, caption=None, parent_ids=None, library="Default", collection="None", tags="", format="mp4", codec="h264", allow_duplicates=False, save_backup=False, **kwargs):
+    @timed_node("embeddr.SaveVideo")
+    def execute(cls, video, caption=None, parent_ids=None, library="Default", collection="None", tags="", format="mp4", codec="h264", allow_duplicates=False, save_backup=False, background_upload=False, **kwargs):
         uploaded_ids = []
         config = get_config()
-        endpoint = config.get("endpoint", "http://localhost:8003")
-        api_base_url = endpoint.rstrip("/") + "/api/v1"
-        upload_url = f"{api_base_url}/images/upload"
 
         try:
+            data = {"prompt": caption or ""}
+            if allow_duplicates:
+                data["force"] = "true"
+            if tags:
+                data["tags"] = tags
+            if library != "Default":
+                try:
+                    data["library_id"] = int(library.split(":")[0])
+                except:
+                    pass
+            if parent_ids:
+                data["parent_ids"] = parent_ids
+
+            collection_id = None
+            if collection and collection != "None":
+                try:
+                    collection_id = int(collection.split(":")[0])
+                except:
+                    pass
+
+            if not background_upload and format in STREAMABLE_FORMATS and config.get("video_streaming", True):
+                # Pipe the encoder straight into the request body; no temp file.
+                # Only failures where the server cannot have stored the video (the
+                # muxer can't write to a pipe, or no connection) fall through to the
+                # temp-file path below; anything else may have been stored already.
+                try:
+                    response = stream_upload(
+                        lambda stream: video.save_to(stream, format=format, codec=codec),
+                        data, f"video.{format}", f"video/{format}", config=config)
+                except Exception as e:
+                    if not isinstance(e, StreamProducerError) and not connect_failed(e):
+                        raise
+                    print(f"[Embeddr] Streaming upload failed ({e}), retrying via a temp file")
+                else:
+                    response.raise_for_status()
+                    uploaded_id = response.json().get("id")
+                    uploaded_ids.append(str(uploaded_id))
+                    cls._add_to_collection(collection_id, uploaded_id, config)
+                    return io.NodeOutput(",".join(uploaded_ids))
+
             # Create temp file
             with tempfile.NamedTemporaryFile(suffix=f".{format}", delete=False) as tmp:
                 temp_path = tmp.name
@@ -68,37 +113,20 @@ class EmbeddrUploadVideo(io.ComfyNode):
             # But often strings work or we can map them if we knew the library.
             video.save_to(temp_path, format=format, codec=codec)
 
-            # Upload
-            with open(temp_path, "rb") as f:
-                files = {"file": (f"video.{format}", f, f"video/{format}")}
-                data = {"prompt": caption or ""}
-                if allow_duplicates:
-                    data["force"] = "true"
-                if tags:
-                    data["tags"] = tags
-                if library != "Default":
-                    try:
-                        data["library_id"] = int(library.split(":")[0])
-                    except:
-                        pass
-                if parent_ids:
-                    data["parent_ids"] = parent_ids
-
-                response = requests.post(upload_url, files=files, data=data)
-                response.raise_for_status()
-                result = response.json()
-                uploaded_id = result.get("id")
-                uploaded_ids.append(str(uploaded_id))
-
-                if collection and collection != "None" and uploaded_id:
-                    try:
-                        collection_id = int(collection.split(":")[0])
-                        requests.post(
-                            f"{api_base_url}/collections/{collection_id}/items",
-                            json={"image_id": uploaded_id}
-                        )
-                    except Exception as e:
-                        print(f"[Embeddr] Failed to add to collection: {e}")
+            if background_upload:
+                uploaded_ids.append(enqueue_file(
+                    temp_path, f"video.{format}", f"video/{format}", data, collection_id, config=config))
+                return io.NodeOutput(",".join(uploaded_ids))
+
+            # Upload (resumable in parts for large files when the server supports it)
+            response = upload_file(temp_path, data, f"video.{format}",
+                                   f"video/{format}", config=config)
+            response.raise_for_status()
+            result = response.json()
+            uploaded_id = result.get("id")
+            uploaded_ids.append(str(uploaded_id))
+
+            cls._add_to_collection(collection_id, uploaded_id, config)
 
         except Exception as e:
             print(f"[Embeddr] Video upload failed: {e}")
@@ -108,3 +136,16 @@ class EmbeddrUploadVideo(io.ComfyNode):
                 os.remove(temp_path)
 
         return io.NodeOutput(",".join(uploaded_ids))
+
+    @staticmethod
+    def _add_to_collection(collection_id, uploaded_id, config):
+        if collection_id is None or not uploaded_id:
+            return
+        try:
+            api_post(
+                f"collections/{collection_id}/items",
+                config=config,
+                json={"image_id": uploaded_id}
+            )
+        except Exception as e:
+            print(f"[Embeddr] Failed to add to collection: {e}")
@@ -0,0 +1,171 @@
+import json
+import time
+import asyncio
+import threading
+import aiohttp
+import requests
+from .api import (api_url, get_timeout, get_upload_timeout, DEFAULT_POOL_SIZE,
+                  DEFAULT_MAX_RETRIES, DEFAULT_RETRY_BACKOFF)
+from .config import get_config
+from . import metrics
+
+RETRY_STATUSES = (429, 502, 503, 504)
+RETRY_METHODS = ("GET", "HEAD")
+
+# aiohttp sessions are bound to the loop that created them, and ComfyUI runs
+# each prompt in a fresh asyncio.run, so requests run on one long-lived
+# client loop in a daemon thread that owns the shared session.
+_loop = None
+_loop_lock = threading.Lock()
+_session = None
+_session_key = None
+
+
+class Response:
+    """
+    Fully read aiohttp response with the parts of the requests.Response API
+    the nodes use, so sync and async paths share their error handling.
+    """
+
+    def __init__(self, status, headers, content):
+        self.status_code = status
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+
+def _client_timeout(timeout):
+    connect, read = timeout
+    return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+
+def _client_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="embeddr-aio", daemon=True).start()
+        return _loop
+
+
+async def _on_client_loop(coro):
+    """Run coro on the client loop and await its result from the caller's loop."""
+    loop = _client_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+async def _get_session(config):
+    """The keep-alive session, rebuilt if the pool size changed. Client loop only."""
+    global _session, _session_key
+    pool_size = int(config.get("pool_size", DEFAULT_POOL_SIZE))
+    if _session is None or _session.closed or _session_key != pool_size:
+        if _session is not None and not _session.closed:
+            await _session.close()
+        connector = aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size)
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_key = pool_size
+    return _session
+
+
+async def _close_session():
+    global _session
+    session, _session = _session, None
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def close_session():
+    """Close the shared session; the next request opens a new one."""
+    await _on_client_loop(_close_session())
+
+
+async def request(method, path, config=None, timeout=None, **kwargs):
+    """
+    Async counterpart of api.request: same URL scheme, timeouts, metrics and
+    retry policy (idempotent reads only), over a shared aiohttp session.
+    """
+    return await _on_client_loop(_request(method, path, config, timeout, **kwargs))
+
+
+async def _request(method, path, config=None, timeout=None, **kwargs):
+    if config is None:
+        config = get_config()
+    if timeout is None:
+        timeout = get_timeout(config)
+    url = api_url(path, config)
+    group = metrics.path_group(path)
+    retries = int(config.get("max_retries", DEFAULT_MAX_RETRIES)) if method in RETRY_METHODS else 0
+    backoff = float(config.get("retry_backoff", DEFAULT_RETRY_BACKOFF))
+    session = await _get_session(config)
+
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            async with session.request(method, url, timeout=_client_timeout(timeout), **kwargs) as resp:
+                content = await resp.read()
+                status = resp.status
+                response = Response(resp.status, resp.headers, content)
+                sent = resp.request_info.headers.get("Content-Length")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt >= retries:
+                raise requests.ConnectionError(str(e)) from e
+        finally:
+            metrics.observe("embeddr_http_request_seconds", time.perf_counter() - start,
+                            method=method, path=group)
+            metrics.inc("embeddr_http_requests_total", method=method, path=group, status=status)
+
+        if status != "error":
+            if sent:
+                metrics.inc("embeddr_http_sent_bytes_total", int(sent), method=method, path=group)
+            metrics.inc("embeddr_http_received_bytes_total", len(content),
+                        method=method, path=group)
+            if status not in RETRY_STATUSES or attempt >= retries:
+                return response
+        attempt += 1
+        await asyncio.sleep(backoff * (2 ** (attempt - 1)))
+
+
+async def api_get(path, **kwargs):
+    return await request("GET", path, **kwargs)
+
+
+async def api_post(path, **kwargs):
+    return await request("POST", path, **kwargs)
+
+
+def form_data(fields, files):
+    """Build a multipart body from requests-style data= and files= arguments."""
+    form = aiohttp.FormData()
+    for name, value in (fields or {}).items():
+        form.add_field(name, str(value))
+    for name, (filename, content, mime) in (files or {}).items():
+        form.add_field(name, content, filename=filename, content_type=mime)
+    return form
+
+
+async def upload(path, fields, files, config=None):
+    """Multipart POST with the upload timeout; never retried."""
+    if config is None:
+        config = get_config()
+    return await api_post(path, config=config, timeout=get_upload_timeout(config),
+                          data=form_data(fields, files))
+
+
+async def run_sync(fn, *args):
+    """Run blocking work (decoding, disk I/O) on the default executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, fn, *args)
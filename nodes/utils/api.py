@@ -1,34 +1,148 @@
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from .config import get_config
+from . import metrics
 
+DEFAULT_ENDPOINT = "http://localhost:8003"
+DEFAULT_POOL_SIZE = 16
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_UPLOAD_TIMEOUT = 300.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.3
 
-def get_libraries():
-    try:
+_session = None
+_session_key = None
+_single_session = None
+_single_session_key = None
+_session_lock = threading.Lock()
+
+
+def get_endpoint(config=None):
+    if config is None:
         config = get_config()
-        endpoint = config.get("endpoint", "http://localhost:8003")
-        api_url = endpoint.rstrip("/") + "/api/v1/libraries"
-        response = requests.get(api_url)
-        if response.status_code == 200:
-            data = response.json()
-            # Return list of names, but we might need IDs.
-            # ComfyUI Combo inputs usually take a list of strings.
-            # We can format as "Name (ID)" or just names if unique.
-            # Let's return a list of strings formatted as "ID: Name" for easy parsing
-            return [f"{lib['id']}: {lib['name']}" for lib in data]
-    except Exception as e:
-        print(f"[Embeddr] Failed to fetch libraries: {e}")
-    return []
-
-
-def get_collections():
-    try:
+    return config.get("endpoint", DEFAULT_ENDPOINT).rstrip("/")
+
+
+def api_url(path, config=None):
+    return f"{get_endpoint(config)}/api/v1/{path.lstrip('/')}"
+
+
+def get_timeout(config=None, read=None):
+    # requests takes a (connect, read) tuple so a dead host fails fast
+    # while slow but healthy transfers still get the full read window.
+    if config is None:
         config = get_config()
-        endpoint = config.get("endpoint", "http://localhost:8003")
-        api_url = endpoint.rstrip("/") + "/api/v1/collections"
-        response = requests.get(api_url)
-        if response.status_code == 200:
-            data = response.json()
-            return [f"{col['id']}: {col['name']}" for col in data]
-    except Exception as e:
-        print(f"[Embeddr] Failed to fetch collections: {e}")
-    return []
+    connect_timeout = float(config.get(
+        "connect_timeout", DEFAULT_CONNECT_TIMEOUT))
+    if read is None:
+        read = float(config.get("read_timeout", DEFAULT_READ_TIMEOUT))
+    return (connect_timeout, read)
+
+
+def get_upload_timeout(config=None):
+    if config is None:
+        config = get_config()
+    return get_timeout(config, read=float(config.get("upload_timeout", DEFAULT_UPLOAD_TIMEOUT)))
+
+
+def _build_session(pool_size, max_retries, backoff):
+    # Only idempotent reads are retried; uploads are never replayed.
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(config=None, retry=True):
+    """
+    Return the shared keep-alive session, rebuilding it if the pool settings
+    changed. retry=False gives a session that never retries, for probes that
+    must fail fast (startup, change checks) rather than wait out the backoff.
+    """
+    global _session, _session_key, _single_session, _single_session_key
+    if config is None:
+        config = get_config()
+    pool_size = int(config.get("pool_size", DEFAULT_POOL_SIZE))
+    with _session_lock:
+        if not retry:
+            if _single_session is None or _single_session_key != pool_size:
+                if _single_session is not None:
+                    _single_session.close()
+                _single_session = _build_session(pool_size, 0, 0)
+                _single_session_key = pool_size
+            return _single_session
+
+        key = (
+            pool_size,
+            int(config.get("max_retries", DEFAULT_MAX_RETRIES)),
+            float(config.get("retry_backoff", DEFAULT_RETRY_BACKOFF)),
+        )
+        if _session is None or _session_key != key:
+            if _session is not None:
+                _session.close()
+            _session = _build_session(*key)
+            _session_key = key
+        return _session
+
+
+def request(method, path, config=None, timeout=None, retry=True, **kwargs):
+    """Issue a request against the Embeddr /api/v1 API through the shared session."""
+    if config is None:
+        config = get_config()
+    if timeout is None:
+        timeout = get_timeout(config)
+    url = api_url(path, config)
+    group = metrics.path_group(path)
+    start = time.perf_counter()
+    status = "error"
+    try:
+        response = get_session(config, retry).request(method, url, timeout=timeout, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        metrics.observe("embeddr_http_request_seconds", time.perf_counter() - start,
+                        method=method, path=group)
+        metrics.inc("embeddr_http_requests_total", method=method, path=group, status=status)
+        if status != "error":
+            sent = response.request.headers.get("Content-Length")
+            if sent:
+                metrics.inc("embeddr_http_sent_bytes_total", int(sent), method=method, path=group)
+            metrics.inc("embeddr_http_received_bytes_total", len(response.content),
+                        method=method, path=group)
+
+
+def api_get(path, **kwargs):
+    return request("GET", path, **kwargs)
+
+
+def api_post(path, **kwargs):
+    return request("POST", path, **kwargs)
+
+
+def fetch_libraries(config=None, timeout=None, retry=True):
+    response = api_get("libraries", config=config, timeout=timeout, retry=retry)
+    response.raise_for_status()
+    # ComfyUI Combo inputs take a list of strings, so format as "ID: Name" for easy parsing
+    return [f"{lib['id']}: {lib['name']}" for lib in response.json()]
+
+
+def fetch_collections(config=None, timeout=None, retry=True):
+    response = api_get("collections", config=config, timeout=timeout, retry=retry)
+    response.raise_for_status()
+    return [f"{col['id']}: {col['name']}" for col in response.json()]
@@ -0,0 +1,174 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from .config import get_config
+from . import metrics
+
+DEFAULT_CACHE_MB = 1024
+DEFAULT_SEARCH_CACHE_TTL = 300.0
+SEARCH_CACHE_BYTES = 16 * 1024 * 1024
+
+
+def estimate_size(value):
+    """Approximate resident size in bytes of a cached value (tensors, arrays, bytes and containers of them)."""
+    if value is None:
+        return 0
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.element_size() * value.nelement()
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    return 64
+
+
+def tensor_digest(tensor):
+    """Fast content hash of a tensor/array, including its shape and dtype."""
+    if hasattr(tensor, "detach"):
+        tensor = tensor.detach().cpu().contiguous().numpy()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{tensor.shape}{tensor.dtype}".encode("utf-8"))
+    digest.update(memoryview(tensor).cast("B"))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by an approximate byte budget, with optional per-entry expiry."""
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self._entries.pop(key)
+                self.current_bytes -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        if size is None:
+            size = estimate_size(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            if size > self.max_bytes:
+                return False
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._entries[key] = (value, size, expires_at)
+            self.current_bytes += size
+            self._evict()
+            return True
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self.current_bytes -= entry[1]
+            return entry[0]
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache(config=None):
+    """Shared cache for decoded images, sized by `cache_max_mb` in config.json."""
+    global _image_cache
+    if config is None:
+        config = get_config()
+    max_bytes = int(float(config.get("cache_max_mb", DEFAULT_CACHE_MB)) * 1024 * 1024)
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = LRUCache(max_bytes)
+        elif _image_cache.max_bytes != max_bytes:
+            _image_cache.resize(max_bytes)
+        return _image_cache
+
+
+_search_cache = None
+
+
+def get_search_cache(config=None):
+    """Shared cache of search result ID lists, expiring after `search_cache_ttl` seconds (0 disables it)."""
+    global _search_cache
+    if config is None:
+        config = get_config()
+    ttl = float(config.get("search_cache_ttl", DEFAULT_SEARCH_CACHE_TTL))
+    if ttl <= 0:
+        return None
+    with _image_cache_lock:
+        if _search_cache is None:
+            _search_cache = LRUCache(SEARCH_CACHE_BYTES, ttl=ttl)
+        _search_cache.ttl = ttl
+        return _search_cache
+
+
+@metrics.register_collector
+def _cache_metrics():
+    samples = []
+    for name, cache in (("images", _image_cache), ("search", _search_cache)):
+        if cache is None:
+            continue
+        stats = cache.stats()
+        for field in ("entries", "bytes"):
+            samples.append((f"embeddr_cache_{field}", {"cache": name}, stats[field]))
+        for field in ("hits", "misses", "evictions"):
+            samples.append((f"embeddr_cache_{field}_total", {"cache": name}, stats[field]))
+    return samples
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import threading
+from .api import fetch_libraries, fetch_collections, get_endpoint
+from .config import get_config
+
+DEFAULT_CATALOG_TTL = 300.0
+# Only used when there is no copy on disk for the current endpoint yet.
+BOOTSTRAP_TIMEOUT = (1.0, 2.0)
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), "cache", "catalog.json")
+
+# endpoint -> {"libraries": [...], "collections": [...], "fetched_at": float}
+_catalogs = None
+_lock = threading.Lock()
+_refreshing = set()
+
+
+def _load_disk():
+    global _catalogs
+    if _catalogs is not None:
+        return
+    _catalogs = {}
+    try:
+        with open(CATALOG_PATH, "r") as f:
+            _catalogs = json.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[Embeddr] Failed to read catalog cache: {e}")
+
+
+def _save_disk():
+    try:
+        os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+        tmp_path = f"{CATALOG_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_catalogs, f)
+        os.replace(tmp_path, CATALOG_PATH)
+    except Exception as e:
+        print(f"[Embeddr] Failed to write catalog cache: {e}")
+
+
+def refresh_catalog(config=None, timeout=None, retry=True):
+    """Fetch libraries and collections now and store them as the last known good copy."""
+    if config is None:
+        config = get_config()
+    endpoint = get_endpoint(config)
+    libraries = fetch_libraries(config, timeout=timeout, retry=retry)
+    collections = fetch_collections(config, timeout=timeout, retry=retry)
+    entry = {
+        "libraries": libraries,
+        "collections": collections,
+        "fetched_at": time.time(),
+    }
+    with _lock:
+        _load_disk()
+        _catalogs[endpoint] = entry
+        _save_disk()
+    return entry
+
+
+def _refresh_in_background(config, endpoint):
+    with _lock:
+        if endpoint in _refreshing:
+            return
+        _refreshing.add(endpoint)
+
+    def run():
+        try:
+            refresh_catalog(config)
+        except Exception as e:
+            print(f"[Embeddr] Failed to refresh libraries/collections: {e}")
+        finally:
+            with _lock:
+                _refreshing.discard(endpoint)
+
+    threading.Thread(target=run, name="embeddr-catalog", daemon=True).start()
+
+
+def get_catalog(config=None):
+    """
+    Return the cached catalog for the configured endpoint. Stale entries are
+    served as-is while a background refresh runs; only an endpoint that has
+    never been seen is fetched inline, and then with a short timeout and no
+    retries, so an unresponsive server costs one read timeout at most.
+    """
+    if config is None:
+        config = get_config()
+    endpoint = get_endpoint(config)
+    with _lock:
+        _load_disk()
+        entry = _catalogs.get(endpoint)
+
+    if entry is None:
+        try:
+            return refresh_catalog(config, timeout=BOOTSTRAP_TIMEOUT, retry=False)
+        except Exception as e:
+            print(f"[Embeddr] Failed to fetch libraries/collections: {e}")
+            # Remember the miss in memory so other schemas don't wait again
+            entry = {"libraries": [], "collections": [], "fetched_at": 0}
+            with _lock:
+                _catalogs.setdefault(endpoint, entry)
+            _refresh_in_background(config, endpoint)
+            return entry
+
+    ttl = float(config.get("catalog_ttl", DEFAULT_CATALOG_TTL))
+    if time.time() - entry.get("fetched_at", 0) > ttl:
+        _refresh_in_background(config, endpoint)
+    return entry
+
+
+def get_libraries():
+    return list(get_catalog().get("libraries", []))
+
+
+def get_collections():
+    return list(get_catalog().get("collections", []))
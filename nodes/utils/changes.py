@@ -0,0 +1,80 @@
+import time
+import threading
+from .api import api_get, get_endpoint
+from .config import get_config
+
+DEFAULT_PROBE_INTERVAL = 2.0
+# (connect, read) for the probe; it runs while ComfyUI checks the queue
+PROBE_TIMEOUT = (1.0, 2.0)
+
+# (endpoint, library, collection) -> (checked_at, etag, fingerprint)
+_probes = {}
+_lock = threading.Lock()
+
+
+def _listing_params(library, collection):
+    """Query params for an "ID: Name" library/collection pair ("All" means no filter)."""
+    params = {}
+
+    # Parse Library ID
+    if library != "All":
+        try:
+            params["library_id"] = int(library.split(":")[0])
+        except:
+            pass
+
+    # Parse Collection ID
+    if collection != "All":
+        try:
+            params["collection_id"] = int(collection.split(":")[0])
+        except:
+            pass
+    return params
+
+
+def listing_fingerprint(library="All", collection="All", config=None):
+    """
+    Cheap change probe for a library/collection listing: one limit=1 request
+    that yields the server's ETag when it sends one, otherwise
+    (total, newest id, newest updated_at). Results are reused for
+    change_probe_interval seconds, so fingerprint_inputs and execute in the
+    same queue run share one request. Returns None when the server can't be
+    reached, which callers treat as "unknown"; failures are cached for the
+    same interval and the probe is never retried.
+    """
+    if config is None:
+        config = get_config()
+    key = (get_endpoint(config), library, collection)
+    interval = float(config.get("change_probe_interval", DEFAULT_PROBE_INTERVAL))
+
+    with _lock:
+        checked_at, etag, fingerprint = _probes.get(key, (None, None, None))
+    if checked_at is not None and time.monotonic() - checked_at < interval:
+        return fingerprint
+
+    params = _listing_params(library, collection)
+    params.update({"limit": 1, "sort": "new"})
+    headers = {"If-None-Match": etag} if etag else {}
+    try:
+        response = api_get("images", config=config, timeout=PROBE_TIMEOUT, retry=False,
+                           params=params, headers=headers)
+        # 304 means the listing still matches the ETag we already hold
+        if response.status_code != 304 or fingerprint is None:
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            if etag:
+                fingerprint = etag
+            else:
+                data = response.json()
+                items = data.get("items", [])
+                newest = items[0] if items else {}
+                fingerprint = (data.get("total"), newest.get("id"),
+                               newest.get("updated_at") or newest.get("created_at"))
+    except Exception as e:
+        print(f"[Embeddr] Change probe failed for {library}/{collection}: {e}")
+        # Drop the ETag too, so the next probe is a plain request
+        etag, fingerprint = None, None
+
+    with _lock:
+        _probes[key] = (time.monotonic(), etag, fingerprint)
+    return fingerprint
@@ -1,15 +1,79 @@
 import os
 import json
+import time
+import threading
 
+# Go up 3 levels: utils -> nodes -> embeddr-comfyui
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), "config.json")
 
-def get_config():
+# How often (seconds) the file's mtime is checked for external edits.
+CHECK_INTERVAL = 1.0
+
+_config = {}
+_mtime = None
+_checked_at = None
+_lock = threading.Lock()
+
+
+def _read_mtime():
     try:
-        # Go up 3 levels: utils -> nodes -> embeddr-comfyui
-        base_path = os.path.dirname(os.path.dirname(
-            os.path.dirname(__file__)))
-        config_path = os.path.join(base_path, "config.json")
-        if os.path.exists(config_path):
-            return json.load(open(config_path, "r"))
-    except Exception:
-        pass
-    return {}
+        return os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load():
+    global _config, _mtime
+    mtime = _read_mtime()
+    config = {}
+    if mtime is not None:
+        try:
+            with open(CONFIG_PATH, "r") as f:
+                config = json.load(f)
+        except Exception as e:
+            print(f"[Embeddr] Failed to read config: {e}")
+            # Keep serving the last good copy if the file is mid-edit or broken
+            if _mtime is not None:
+                config = _config
+    _config = config
+    _mtime = mtime
+
+
+def get_config():
+    """
+    Return the parsed config.json. The parsed dict is kept in memory and only
+    re-read when the file's mtime changes. Callers must treat it as read-only.
+    """
+    global _checked_at
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < CHECK_INTERVAL:
+        return _config
+    with _lock:
+        _checked_at = now
+        if _read_mtime() != _mtime:
+            _load()
+        return _config
+
+
+def update_config(values):
+    """Merge values into the config and write it atomically. Returns the new config."""
+    global _config, _mtime, _checked_at
+    with _lock:
+        if _read_mtime() != _mtime:
+            _load()
+        config = dict(_config)
+        config.update(values)
+
+        tmp_path = f"{CONFIG_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(config, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CONFIG_PATH)
+
+        # Swap in a new dict so concurrent readers never see a partial update
+        _config = config
+        _mtime = _read_mtime()
+        _checked_at = time.monotonic()
+        return config
@@ -0,0 +1,195 @@
+import os
+import json
+import hashlib
+import threading
+from .api import get_endpoint
+from .config import get_config
+from . import aio
+from . import metrics
+
+DEFAULT_DEDUPE_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), "cache", "hashes.jsonl")
+DEFAULT_MAX_ENTRIES = 100000
+# The log is rewritten once it holds this many more lines than live entries
+COMPACT_SLACK = 10000
+
+# "<endpoint>|<kind>|<digest>" -> Embeddr ID, oldest first.
+# kind is "pixels" (uint8 pixels + encode settings, checked before encoding)
+# or "file" (sha256 of the encoded bytes, checked before uploading).
+# On disk it is an append-only log of [key, id] lines; later lines win.
+_entries = None
+_path = None
+_log_lines = 0
+_lock = threading.Lock()
+
+# Endpoints without a hash lookup route, so we stop asking
+_no_hash_route = set()
+
+
+def enabled(config=None):
+    if config is None:
+        config = get_config()
+    return bool(config.get("dedupe_index", True))
+
+
+def pixel_key(array, fmt, compress_level, quality, caption, library):
+    """
+    Digest of a uint8 [H, W, C] image plus everything that changes the
+    uploaded file, so equal keys mean the server would get identical bytes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{array.shape}|{fmt}|{compress_level}|{quality}|{caption or ''}|{library}".encode("utf-8"))
+    digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
+def file_key(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _max_entries(config):
+    return int(config.get("dedupe_max_entries", DEFAULT_MAX_ENTRIES))
+
+
+def _evict(entries, config):
+    while len(entries) > _max_entries(config):
+        entries.pop(next(iter(entries)))
+
+
+def _load(config):
+    """Replay the log on first use. Blocking; async callers go through aio.run_sync."""
+    global _entries, _path, _log_lines
+    path = config.get("dedupe_path", DEFAULT_DEDUPE_PATH)
+    if _entries is None or _path != path:
+        _path = path
+        _entries = {}
+        _log_lines = 0
+        torn = False
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    _log_lines += 1
+                    try:
+                        key, image_id = json.loads(line)
+                    except ValueError:
+                        # Torn last line from an interrupted append
+                        torn = True
+                        continue
+                    _entries.pop(key, None)
+                    _entries[key] = image_id
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[Embeddr] Failed to read duplicate index: {e}")
+        _evict(_entries, config)
+        if torn:
+            # Rewrite now, or the next append would continue the torn line
+            try:
+                _compact()
+            except Exception as e:
+                print(f"[Embeddr] Failed to save duplicate index: {e}")
+    return _entries
+
+
+def _append(lines):
+    global _log_lines
+    os.makedirs(os.path.dirname(_path), exist_ok=True)
+    with open(_path, "a") as f:
+        f.write("".join(lines))
+    _log_lines += len(lines)
+
+
+def _compact():
+    """Rewrite the log with only the live entries."""
+    global _log_lines
+    os.makedirs(os.path.dirname(_path), exist_ok=True)
+    tmp_path = f"{_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        for key, image_id in _entries.items():
+            f.write(json.dumps([key, image_id]) + "\n")
+    os.replace(tmp_path, _path)
+    _log_lines = len(_entries)
+
+
+def lookup(kind, digest, config=None):
+    """Embeddr ID previously recorded for this digest on the current endpoint, or None."""
+    if config is None:
+        config = get_config()
+    with _lock:
+        image_id = _load(config).get(f"{get_endpoint(config)}|{kind}|{digest}")
+    metrics.inc("embeddr_dedupe_total", kind=kind,
+                result="hit" if image_id is not None else "miss")
+    return image_id
+
+
+def record(pairs, config=None):
+    """
+    Remember (kind, digest) -> ID for every (kind, digest, image_id) in pairs.
+    Appends to the log, which is compacted once it outgrows the live entries
+    by COMPACT_SLACK lines.
+    """
+    if config is None:
+        config = get_config()
+    endpoint = get_endpoint(config)
+    with _lock:
+        entries = _load(config)
+        lines = []
+        for kind, digest, image_id in pairs:
+            key = f"{endpoint}|{kind}|{digest}"
+            entries.pop(key, None)
+            entries[key] = str(image_id)
+            lines.append(json.dumps([key, str(image_id)]) + "\n")
+        _evict(entries, config)
+        try:
+            if _log_lines + len(lines) > len(entries) + COMPACT_SLACK:
+                _compact()
+            else:
+                _append(lines)
+        except Exception as e:
+            print(f"[Embeddr] Failed to save duplicate index: {e}")
+
+
+def clear(config=None):
+    if config is None:
+        config = get_config()
+    with _lock:
+        _load(config).clear()
+        try:
+            _compact()
+        except Exception as e:
+            print(f"[Embeddr] Failed to save duplicate index: {e}")
+
+
+def stats(config=None):
+    if config is None:
+        config = get_config()
+    with _lock:
+        return {"entries": len(_load(config)), "path": _path, "log_lines": _log_lines}
+
+
+async def check_server(sha256, config=None):
+    """
+    Ask the server whether it already has a file with this hash
+    (GET images/hash/{sha256}); returns its ID or None. Only runs when
+    dedupe_server_check is on, and stops asking servers without the route.
+    """
+    if config is None:
+        config = get_config()
+    endpoint = get_endpoint(config)
+    if not config.get("dedupe_server_check", False) or endpoint in _no_hash_route:
+        return None
+    try:
+        response = await aio.api_get(f"images/hash/{sha256}", config=config)
+    except Exception as e:
+        print(f"[Embeddr] Hash check failed: {e}")
+        return None
+    if response.status_code in (405, 501):
+        _no_hash_route.add(endpoint)
+        return None
+    if response.status_code != 200:
+        metrics.inc("embeddr_dedupe_total", kind="server", result="miss")
+        return None
+    image_id = response.json().get("id")
+    metrics.inc("embeddr_dedupe_total", kind="server",
+                result="hit" if image_id is not None else "miss")
+    return str(image_id) if image_id is not None else None
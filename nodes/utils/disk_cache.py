@@ -0,0 +1,165 @@
+import os
+import json
+import threading
+from .config import get_config
+from . import metrics
+
+DEFAULT_DISK_CACHE_MB = 2048
+DEFAULT_DISK_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "cache", "files")
+
+
+def _safe_key(key):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(key))
+
+
+class DiskCache:
+    """
+    Size-capped on-disk store of raw file bytes with their HTTP validators.
+    Entries are `<key>.bin` plus a `<key>.json` sidecar; recency is tracked
+    through the data file's mtime so the LRU order survives restarts.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = None
+
+    def _paths(self, key):
+        name = _safe_key(key)
+        return (os.path.join(self.directory, name + ".bin"),
+                os.path.join(self.directory, name + ".json"))
+
+    def _scan(self):
+        if self._sizes is not None:
+            return
+        self._sizes = {}
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".bin"):
+                self._sizes[entry.name[:-4]] = entry.stat().st_size
+
+    def get(self, key):
+        """Return (content, meta) for a cached entry, or (None, None)."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(data_path, "rb") as f:
+                content = f.read()
+            meta = {}
+            if os.path.exists(meta_path):
+                with open(meta_path, "r") as f:
+                    meta = json.load(f)
+            os.utime(data_path)
+            return content, meta
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            print(f"[Embeddr] Disk cache read failed for {key}: {e}")
+            return None, None
+
+    def touch(self, key):
+        data_path, _ = self._paths(key)
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+
+    def put(self, key, content, meta=None):
+        if len(content) > self.max_bytes:
+            return
+        data_path, meta_path = self._paths(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            suffix = f".{threading.get_ident()}.tmp"
+            with open(data_path + suffix, "wb") as f:
+                f.write(content)
+            with open(meta_path + suffix, "w") as f:
+                json.dump(meta or {}, f)
+            os.replace(meta_path + suffix, meta_path)
+            os.replace(data_path + suffix, data_path)
+        except Exception as e:
+            print(f"[Embeddr] Disk cache write failed for {key}: {e}")
+            return
+
+        with self._lock:
+            self._scan()
+            self._sizes[_safe_key(key)] = len(content)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        entries = []
+        for name in self._sizes:
+            try:
+                mtime = os.path.getmtime(
+                    os.path.join(self.directory, name + ".bin"))
+            except OSError:
+                mtime = 0
+            entries.append((mtime, name))
+        entries.sort()
+        for _, name in entries:
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.pop(name)
+            for suffix in (".bin", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._scan()
+            for name in list(self._sizes):
+                for suffix in (".bin", ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, name + suffix))
+                    except OSError:
+                        pass
+            self._sizes = {}
+
+    def stats(self):
+        with self._lock:
+            self._scan()
+            return {
+                "entries": len(self._sizes),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+
+
+def get_disk_cache(config=None):
+    """Shared file cache, or None when `disk_cache_mb` is 0."""
+    global _disk_cache
+    if config is None:
+        config = get_config()
+    max_bytes = int(float(config.get("disk_cache_mb", DEFAULT_DISK_CACHE_MB)) * 1024 * 1024)
+    if max_bytes <= 0:
+        return None
+    directory = config.get("disk_cache_dir") or DEFAULT_DISK_CACHE_DIR
+    with _disk_cache_lock:
+        if _disk_cache is None or _disk_cache.directory != directory:
+            _disk_cache = DiskCache(directory, max_bytes)
+        elif _disk_cache.max_bytes != max_bytes:
+            _disk_cache.max_bytes = max_bytes
+            with _disk_cache._lock:
+                _disk_cache._scan()
+                _disk_cache._evict()
+        return _disk_cache
+
+
+@metrics.register_collector
+def _disk_cache_metrics():
+    if _disk_cache is None:
+        return []
+    stats = _disk_cache.stats()
+    return [("embeddr_cache_entries", {"cache": "files"}, stats["entries"]),
+            ("embeddr_cache_bytes", {"cache": "files"}, stats["bytes"])]
@@ -0,0 +1,97 @@
+import os
+import zlib
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from PIL import Image
+import io as pyio
+from .config import get_config
+from . import metrics
+
+# name -> (PIL format, mime type, file extension)
+UPLOAD_FORMATS = {
+    "png": ("PNG", "image/png", "png"),
+    "webp_lossless": ("WEBP", "image/webp", "webp"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def get_encode_executor(config=None):
+    """Shared pool for image encoding; Pillow's encoders release the GIL so threads scale across cores."""
+    global _executor, _executor_workers
+    if config is None:
+        config = get_config()
+    workers = max(1, int(config.get("encode_workers", os.cpu_count() or 4)))
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="embeddr-encode")
+            _executor_workers = workers
+        return _executor
+
+
+def to_uint8(image):
+    """[N, H, W, C] float tensor in [0, 1] -> uint8 numpy array, converted in one pass."""
+    return (image.clamp(0, 1) * 255).to(dtype=torch.uint8).cpu().numpy()
+
+
+@metrics.timed("embeddr_encode_seconds")
+def encode_image(array, fmt="png", compress_level=4, quality=95):
+    """
+    Encode one uint8 [H, W, C] array, returning (bytes, mime type, extension).
+    The bytes carry pixels only, so identical images upload identical files
+    whatever their caption; see add_png_text for the backup copy.
+    """
+    pil_format, mime, ext = UPLOAD_FORMATS[fmt]
+    img = Image.fromarray(array)
+    buf = pyio.BytesIO()
+    if pil_format == "PNG":
+        img.save(buf, format="PNG", compress_level=compress_level)
+    elif fmt == "webp_lossless":
+        # WebP "method" is its effort knob (0-6); map the 0-9 level onto it
+        img.save(buf, format="WEBP", lossless=True,
+                 method=min(6, compress_level * 6 // 9), quality=100)
+    elif pil_format == "WEBP":
+        img.save(buf, format="WEBP", quality=quality,
+                 method=min(6, compress_level * 6 // 9))
+    else:
+        img.save(buf, format=pil_format, quality=quality)
+    return buf.getvalue(), mime, ext
+
+
+def encode_batch(image, fmt="png", compress_level=4, quality=95, config=None):
+    """Encode every image of a [N, H, W, C] tensor in parallel, preserving order."""
+    arrays = to_uint8(image)
+    if arrays.shape[0] == 1:
+        return [encode_image(arrays[0], fmt, compress_level, quality)]
+    executor = get_encode_executor(config)
+    futures = [executor.submit(encode_image, arrays[i], fmt, compress_level, quality)
+               for i in range(arrays.shape[0])]
+    return [future.result() for future in futures]
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def add_png_text(content, key, text):
+    """
+    Insert a text chunk right after the IHDR of encoded PNG bytes, without
+    re-encoding. Like Pillow's PngInfo.add_text, latin-1 text goes in tEXt
+    and anything else in an uncompressed iTXt.
+    """
+    try:
+        chunk = _png_chunk(b"tEXt", key.encode("latin-1") + b"\0" + text.encode("latin-1"))
+    except UnicodeEncodeError:
+        chunk = _png_chunk(b"iTXt", key.encode("latin-1") + b"\0\0\0\0\0" + text.encode("utf-8"))
+    # 8-byte signature, then IHDR: length, type, 13 data bytes, CRC
+    end = 8 + 4 + 4 + 13 + 4
+    return content[:end] + chunk + content[end:]
@@ -0,0 +1,60 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .config import get_config
+
+DEFAULT_DOWNLOAD_CONCURRENCY = 8
+DEFAULT_UPLOAD_CONCURRENCY = 4
+
+
+def get_concurrency(config=None, key="download_concurrency", default=DEFAULT_DOWNLOAD_CONCURRENCY):
+    if config is None:
+        config = get_config()
+    return max(1, int(config.get(key, default)))
+
+
+def map_ordered(fn, items, config=None, label="item", workers=None):
+    """
+    Run fn over items on a bounded thread pool and return the results in input order.
+    Items whose call raises are logged and come back as None so callers can skip them.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def run(item):
+        try:
+            return fn(item)
+        except Exception as e:
+            print(f"[Embeddr] Failed to load {label} {item}: {e}")
+            return None
+
+    if workers is None:
+        workers = get_concurrency(config)
+    workers = min(workers, len(items))
+    if workers == 1:
+        return [run(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embeddr-fetch") as pool:
+        return list(pool.map(run, items))
+
+
+async def map_ordered_async(fn, items, config=None, label="item", workers=None):
+    """
+    Await the coroutine function fn over items, at most `workers` at a time,
+    and return the results in input order. Failures are logged and become None.
+    """
+    items = list(items)
+    if not items:
+        return []
+    if workers is None:
+        workers = get_concurrency(config)
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(item):
+        async with semaphore:
+            try:
+                return await fn(item)
+            except Exception as e:
+                print(f"[Embeddr] Failed to load {label} {item}: {e}")
+                return None
+
+    return await asyncio.gather(*(run(item) for item in items))
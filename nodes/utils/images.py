@@ -0,0 +1,394 @@
+import torch
+import hashlib
+import numpy as np
+import requests
+from PIL import Image, ImageOps
+from io import BytesIO
+from .api import api_get, get_endpoint
+from .cache import get_image_cache
+from .config import get_config
+from .disk_cache import get_disk_cache
+from . import aio
+from . import metrics
+
+
+DEFAULT_THUMBNAIL_SIZE = 512
+RESOLUTIONS = ["original", "thumbnail", "max_edge"]
+
+# Statuses meaning the server has no thumbnail route at all. A 404 only
+# means this image has no thumbnail (deleted, or not generated yet).
+THUMBNAIL_UNSUPPORTED = (405, 501)
+# Endpoints that answered THUMBNAIL_UNSUPPORTED, so we stop asking
+_no_thumbnails = set()
+
+
+def _disk_key(image_id, config, rendition="file"):
+    """Disk cache key, prefixed with a hash of the endpoint so two servers' IDs never share an entry."""
+    scope = hashlib.blake2b(get_endpoint(config).encode("utf-8"), digest_size=6).hexdigest()
+    return f"{scope}-{image_id}" if rendition == "file" else f"{scope}-{image_id}.{rendition}"
+
+
+def _lookup(image_id, config, rendition):
+    """
+    Disk cache state for a rendition: (disk_cache, key, cached bytes,
+    conditional headers). Headers are None when the cached copy can be used
+    without asking the server.
+    """
+    disk_cache = get_disk_cache(config)
+    cache_key = _disk_key(image_id, config, rendition)
+    cached, meta = (None, None)
+    if disk_cache is not None:
+        cached, meta = disk_cache.get(cache_key)
+
+    headers = {}
+    if cached is not None:
+        if not meta.get("etag") and not meta.get("last_modified"):
+            # Nothing to revalidate against; image files are immutable per ID.
+            return disk_cache, cache_key, cached, None
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    return disk_cache, cache_key, cached, headers
+
+
+def _store(disk_cache, cache_key, cached, response):
+    """Bytes to use for a (possibly conditional) response, saving fresh ones to disk."""
+    if response.status_code == 304 and cached is not None:
+        metrics.inc("embeddr_disk_cache_total", result="revalidated")
+        return cached
+    response.raise_for_status()
+    metrics.inc("embeddr_disk_cache_total", result="miss")
+
+    content = response.content
+    if disk_cache is not None:
+        disk_cache.put(cache_key, content, {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        })
+    return content
+
+
+def fetch_image_bytes(image_id, config=None, rendition="file"):
+    """
+    Return the raw bytes of an image rendition ("file" or "thumbnail"), served
+    from the disk cache when the server confirms (via ETag/Last-Modified) that
+    the cached copy is current.
+    """
+    if config is None:
+        config = get_config()
+    disk_cache, cache_key, cached, headers = _lookup(image_id, config, rendition)
+    if headers is None:
+        metrics.inc("embeddr_disk_cache_total", result="hit")
+        return cached
+
+    try:
+        response = api_get(f"images/{image_id}/{rendition}",
+                           config=config, headers=headers)
+    except Exception as e:
+        if cached is not None:
+            print(f"[Embeddr] Using cached file for {image_id}, server unreachable: {e}")
+            return cached
+        raise
+    return _store(disk_cache, cache_key, cached, response)
+
+
+async def fetch_image_bytes_async(image_id, config=None, rendition="file"):
+    """fetch_image_bytes over the shared aiohttp session; disk cache I/O runs on the executor."""
+    if config is None:
+        config = get_config()
+    disk_cache, cache_key, cached, headers = await aio.run_sync(
+        _lookup, image_id, config, rendition)
+    if headers is None:
+        metrics.inc("embeddr_disk_cache_total", result="hit")
+        return cached
+
+    try:
+        response = await aio.api_get(f"images/{image_id}/{rendition}",
+                                     config=config, headers=headers)
+    except Exception as e:
+        if cached is not None:
+            print(f"[Embeddr] Using cached file for {image_id}, server unreachable: {e}")
+            return cached
+        raise
+    return await aio.run_sync(_store, disk_cache, cache_key, cached, response)
+
+
+FIT_MODES = ["longest_side", "shortest_side"]
+
+
+def _target_size(width, height, max_resolution, fit="longest_side"):
+    """Size that brings the chosen side down to max_resolution, or None if no downscale is needed."""
+    if not max_resolution:
+        return None
+    side = max(width, height) if fit == "longest_side" else min(width, height)
+    if side <= max_resolution:
+        return None
+    scale = max_resolution / side
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+
+def to_float_array(array, invert=False):
+    """uint8 -> float32 in [0, 1] in a single pass, without float64 or intermediate copies."""
+    out = np.empty(array.shape, dtype=np.float32)
+    if invert:
+        np.multiply(array, np.float32(-1.0 / 255.0), out=out, dtype=np.float32)
+        out += np.float32(1.0)
+    else:
+        np.multiply(array, np.float32(1.0 / 255.0), out=out, dtype=np.float32)
+    return out
+
+
+def blank_mask(height, width):
+    """An all-zero [1, H, W] mask as an expanded view of a single element, so no per-pixel memory is allocated."""
+    return torch.zeros((1, 1, 1), dtype=torch.float32).expand(1, height, width)
+
+
+@metrics.timed("embeddr_decode_seconds")
+def decode_image(content, max_resolution=0, fit="longest_side"):
+    """
+    Decode raw file bytes into a uint8 image tensor [1, H, W, 3] and, when the
+    file has an alpha channel, a uint8 alpha tensor [H, W] (otherwise None).
+    With max_resolution set, the image is scaled down so the side picked by
+    fit is at most that many pixels; JPEGs are decoded at reduced scale.
+    Use to_output to turn the result into ComfyUI float tensors.
+    """
+    img = Image.open(BytesIO(content))
+
+    target = _target_size(img.width, img.height, max_resolution, fit)
+    if target is not None and img.format == "JPEG":
+        # Lets libjpeg decode at 1/2, 1/4 or 1/8 scale, never below target
+        img.draft("RGB", target)
+
+    img = ImageOps.exif_transpose(img)
+
+    target = _target_size(img.width, img.height, max_resolution, fit)
+    if target is not None:
+        img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    # np.array (not asarray) so the tensor owns writable memory
+    image = torch.from_numpy(np.array(img.convert("RGB"))).unsqueeze(0)
+
+    alpha = None
+    if 'A' in img.getbands():
+        alpha = torch.from_numpy(np.array(img.getchannel('A')))
+    return image, alpha
+
+
+def to_output(result):
+    """
+    Convert a decoded (uint8 image [1, H, W, 3], uint8 alpha [H, W] or None)
+    pair into ComfyUI's float32 image and [1, H, W] mask. Images without alpha
+    get a blank_mask view of the right size.
+    """
+    image, alpha = result
+    output = torch.from_numpy(to_float_array(image.numpy()))
+    if alpha is None:
+        return output, blank_mask(image.shape[1], image.shape[2])
+    mask = torch.from_numpy(to_float_array(alpha.numpy(), invert=True))
+    return output, mask.unsqueeze(0)
+
+
+def _fetch_thumbnail(image_id, config):
+    """Server thumbnail bytes, or None when this image or the server has none."""
+    endpoint = get_endpoint(config)
+    if endpoint in _no_thumbnails:
+        return None
+    try:
+        return fetch_image_bytes(image_id, config, rendition="thumbnail")
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        if status in THUMBNAIL_UNSUPPORTED:
+            _no_thumbnails.add(endpoint)
+        if status in THUMBNAIL_UNSUPPORTED or status == 404:
+            return None
+        raise
+
+
+async def _fetch_thumbnail_async(image_id, config):
+    endpoint = get_endpoint(config)
+    if endpoint in _no_thumbnails:
+        return None
+    try:
+        return await fetch_image_bytes_async(image_id, config, rendition="thumbnail")
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        if status in THUMBNAIL_UNSUPPORTED:
+            _no_thumbnails.add(endpoint)
+        if status in THUMBNAIL_UNSUPPORTED or status == 404:
+            return None
+        raise
+
+
+def _side(content, fit):
+    # Image.open only parses the header here; pixels are decoded later
+    width, height = Image.open(BytesIO(content)).size
+    return max(width, height) if fit == "longest_side" else min(width, height)
+
+
+def _decode_rendition(image_id, config, max_resolution, fit, resolution):
+    if resolution == "original":
+        return decode_image(fetch_image_bytes(image_id, config),
+                            max_resolution=max_resolution, fit=fit)
+
+    thumbnail_size = int(config.get("thumbnail_size", DEFAULT_THUMBNAIL_SIZE))
+    thumbnail = _fetch_thumbnail(image_id, config)
+    if resolution == "thumbnail":
+        if thumbnail is not None:
+            return decode_image(thumbnail)
+        # No server rendition: downsample the original on the client instead
+        return decode_image(fetch_image_bytes(image_id, config),
+                            max_resolution=thumbnail_size, fit="longest_side")
+
+    # max_edge: the thumbnail is used whenever it is at least as large as asked for
+    edge = max_resolution or thumbnail_size
+    if thumbnail is not None and _side(thumbnail, fit) >= edge:
+        return decode_image(thumbnail, max_resolution=edge, fit=fit)
+    return decode_image(fetch_image_bytes(image_id, config),
+                        max_resolution=edge, fit=fit)
+
+
+async def _decode_rendition_async(image_id, config, max_resolution, fit, resolution):
+    # Same choices as _decode_rendition; downloads are awaited and decoding
+    # runs on the executor, so other images keep downloading meanwhile
+    if resolution == "original":
+        content = await fetch_image_bytes_async(image_id, config)
+        return await aio.run_sync(decode_image, content, max_resolution, fit)
+
+    thumbnail_size = int(config.get("thumbnail_size", DEFAULT_THUMBNAIL_SIZE))
+    thumbnail = await _fetch_thumbnail_async(image_id, config)
+    if resolution == "thumbnail":
+        if thumbnail is not None:
+            return await aio.run_sync(decode_image, thumbnail)
+        content = await fetch_image_bytes_async(image_id, config)
+        return await aio.run_sync(decode_image, content, thumbnail_size, "longest_side")
+
+    edge = max_resolution or thumbnail_size
+    if thumbnail is not None and _side(thumbnail, fit) >= edge:
+        return await aio.run_sync(decode_image, thumbnail, edge, fit)
+    content = await fetch_image_bytes_async(image_id, config)
+    return await aio.run_sync(decode_image, content, edge, fit)
+
+
+def load_raw_image(image_id, config=None, max_resolution=0, fit="longest_side", resolution="original", use_cache=True):
+    """
+    Fetch and decode an Embeddr image by ID as uint8 (image, alpha), going
+    through the shared image cache. Entries stay uint8 in the cache, a
+    quarter of the float32 size; see load_image for the arguments.
+    """
+    if config is None:
+        config = get_config()
+    if not use_cache:
+        return _decode_rendition(image_id, config, max_resolution, fit, resolution)
+    cache = get_image_cache(config)
+    key = ("image", get_endpoint(config), str(image_id), max_resolution,
+           fit if max_resolution else None, resolution)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = _decode_rendition(image_id, config, max_resolution, fit, resolution)
+    cache.put(key, result)
+    return result
+
+
+def load_image(image_id, config=None, max_resolution=0, fit="longest_side", resolution="original", use_cache=True):
+    """
+    Fetch and decode an Embeddr image by ID into a float32 image [1, H, W, 3]
+    and mask [1, H, W], going through the shared image cache.
+
+    resolution picks the rendition: "original" is the full file, "thumbnail"
+    the server's thumbnail, and "max_edge" the smallest rendition that still
+    covers max_resolution (falling back to client-side downsampling).
+    use_cache=False bypasses the memory cache, for one-off walks that would
+    otherwise evict everything else.
+    """
+    return to_output(load_raw_image(image_id, config, max_resolution, fit, resolution, use_cache))
+
+
+async def load_raw_image_async(image_id, config=None, max_resolution=0, fit="longest_side", resolution="original", use_cache=True):
+    """Async load_raw_image, sharing its memory cache."""
+    if config is None:
+        config = get_config()
+    if not use_cache:
+        return await _decode_rendition_async(image_id, config, max_resolution, fit, resolution)
+    cache = get_image_cache(config)
+    key = ("image", get_endpoint(config), str(image_id), max_resolution,
+           fit if max_resolution else None, resolution)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = await _decode_rendition_async(image_id, config, max_resolution, fit, resolution)
+    cache.put(key, result)
+    return result
+
+
+async def load_image_async(image_id, config=None, max_resolution=0, fit="longest_side", resolution="original", use_cache=True):
+    """Async load_image: float32 image [1, H, W, 3] and mask [1, H, W]."""
+    result = await load_raw_image_async(image_id, config, max_resolution, fit, resolution, use_cache)
+    return await aio.run_sync(to_output, result)
+
+
+BATCH_POLICIES = ["resize", "pad", "crop"]
+
+
+def build_batch(images, alphas, policy="resize"):
+    """
+    Stack uint8 [1, H, W, 3] images and their uint8 [H, W] alphas (or None),
+    as returned by load_raw_image, into one preallocated float32
+    [N, H, W, 3] batch and [N, H, W] mask batch.
+
+    resize: scale everything to the first image's size
+    pad:    place each image top-left on a canvas of the largest size; padding is masked
+    crop:   center-crop everything to the smallest size
+    """
+    sizes = [(img.shape[1], img.shape[2]) for img in images]
+    if policy == "pad":
+        height = max(h for h, _ in sizes)
+        width = max(w for _, w in sizes)
+    elif policy == "crop":
+        height = min(h for h, _ in sizes)
+        width = min(w for _, w in sizes)
+    else:
+        height, width = sizes[0]
+
+    # Pixels are copied in as 0-255 values and scaled once for the whole batch
+    # at the end. The mask batch holds alpha until then: 255 where an image has
+    # no alpha channel, 0 for padding.
+    if policy == "pad":
+        batch = torch.zeros((len(images), height, width, 3), dtype=torch.float32)
+        alpha_batch = torch.zeros((len(images), height, width), dtype=torch.float32)
+    else:
+        # Every row is fully overwritten below, so skip the zero fill
+        batch = torch.empty((len(images), height, width, 3), dtype=torch.float32)
+        alpha_batch = torch.full((len(images), height, width), 255., dtype=torch.float32)
+
+    for i, (image, alpha) in enumerate(zip(images, alphas)):
+        h, w = sizes[i]
+        if policy == "pad":
+            batch[i, :h, :w] = image[0]
+            alpha_batch[i, :h, :w] = 255. if alpha is None else alpha
+        elif policy == "crop":
+            top = (h - height) // 2
+            left = (w - width) // 2
+            batch[i] = image[0, top:top + height, left:left + width]
+            if alpha is not None:
+                alpha_batch[i] = alpha[top:top + height, left:left + width]
+        elif (h, w) == (height, width):
+            batch[i] = image[0]
+            if alpha is not None:
+                alpha_batch[i] = alpha
+        else:
+            resized = torch.nn.functional.interpolate(
+                image.movedim(-1, 1).float(), size=(height, width), mode="bilinear",
+                align_corners=False, antialias=True)
+            batch[i] = resized[0].movedim(0, -1).clamp_(0., 255.)
+            if alpha is not None:
+                alpha_batch[i] = torch.nn.functional.interpolate(
+                    alpha[None, None].float(), size=(height, width), mode="bilinear",
+                    align_corners=False)[0, 0]
+
+    batch.mul_(1.0 / 255.0)
+    mask_batch = alpha_batch.mul_(-1.0 / 255.0).add_(1.0)
+    return batch, mask_batch
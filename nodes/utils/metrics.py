@@ -0,0 +1,178 @@
+import re
+import time
+import threading
+import inspect
+import functools
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to slow uploads
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_help = {}
+# Callables returning [(name, labels, value)] for gauges read at scrape time
+_collectors = []
+
+
+def _key(name, labels):
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def describe(name, text):
+    _help[name] = text
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    with _lock:
+        key = _key(name, labels)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name, **labels):
+    """Decorator observing a function's wall time into histogram `name`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_node(node_id):
+    """
+    Decorator recording a node's execute() time and outcome. Coroutine
+    functions stay coroutine functions, so ComfyUI still awaits async nodes.
+    """
+    def record(start, status):
+        observe("embeddr_node_execute_seconds",
+                time.perf_counter() - start, node=node_id)
+        inc("embeddr_node_executions_total", node=node_id, status=status)
+
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                status = "ok"
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    status = "error"
+                    raise
+                finally:
+                    record(start, status)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                record(start, status)
+        return wrapper
+    return decorate
+
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def path_group(path):
+    """Collapse numeric IDs so /images/42/file and /images/7/file share a series."""
+    return _ID_SEGMENT.sub("/{id}", "/" + path.lstrip("/").split("?")[0])
+
+
+def register_collector(fn):
+    _collectors.append(fn)
+    return fn
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def render():
+    """Prometheus text exposition format (0.0.4) of everything recorded so far."""
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                      for key, h in _histograms.items()}
+
+    gauges = {}
+    for collector in _collectors:
+        try:
+            for name, labels, value in collector():
+                # Collected *_total series are monotonic, so expose them as counters
+                target = counters if name.endswith("_total") else gauges
+                target[_key(name, labels)] = value
+        except Exception as e:
+            print(f"[Embeddr] Metrics collector failed: {e}")
+
+    def emit(series, kind):
+        seen = set()
+        for (name, labels), value in sorted(series.items()):
+            if name not in seen:
+                seen.add(name)
+                if name in _help:
+                    lines.append(f"# HELP {name} {_help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for bound, count in zip(BUCKETS, value["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    emit(counters, "counter")
+    emit(gauges, "gauge")
+    emit(histograms, "histogram")
+    return "\n".join(lines) + "\n"
+
+
+describe("embeddr_http_request_seconds", "Latency of requests to the Embeddr server")
+describe("embeddr_http_requests_total", "Requests to the Embeddr server by status")
+describe("embeddr_http_sent_bytes_total", "Request body bytes sent to the Embeddr server")
+describe("embeddr_http_received_bytes_total", "Response body bytes received from the Embeddr server")
+describe("embeddr_node_execute_seconds", "Wall time of node execute()")
+describe("embeddr_node_executions_total", "Node executions by outcome")
+describe("embeddr_decode_seconds", "Image decode and tensor conversion time")
+describe("embeddr_encode_seconds", "Image encode time")
+describe("embeddr_disk_cache_total", "On-disk file cache lookups by result")
@@ -0,0 +1,39 @@
+import os
+import json
+import threading
+
+PROGRESS_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), "cache", "progress.json")
+
+_lock = threading.Lock()
+
+
+def _read():
+    try:
+        with open(PROGRESS_PATH, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[Embeddr] Failed to read progress: {e}")
+        return {}
+
+
+def get_progress(key):
+    """Saved state for a paged walk, or an empty dict when it hasn't started."""
+    with _lock:
+        return dict(_read().get(key, {}))
+
+
+def save_progress(key, state):
+    with _lock:
+        progress = _read()
+        if state is None:
+            progress.pop(key, None)
+        else:
+            progress[key] = state
+        os.makedirs(os.path.dirname(PROGRESS_PATH), exist_ok=True)
+        tmp_path = f"{PROGRESS_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, PROGRESS_PATH)
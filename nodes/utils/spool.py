@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from collections import deque
+from .api import api_post
+from .upload import upload_file
+from .config import get_config
+from . import metrics
+
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), "cache", "spool")
+DEFAULT_MAX_ATTEMPTS = 10
+# Seconds; doubled per failed attempt up to MAX_BACKOFF
+BASE_BACKOFF = 2.0
+MAX_BACKOFF = 300.0
+SPOOL_PREFIX = "spool:"
+# Seconds a finished job's ID is kept for children spooled later, once no
+# queued job refers to it any more
+DEFAULT_DONE_RETENTION = 7 * 24 * 3600.0
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+# job id -> Embeddr ID, read-through cache of the <job>.done records
+_completed = {}
+_recent = deque(maxlen=50)
+
+
+def get_spool_dir(config=None):
+    if config is None:
+        config = get_config()
+    return config.get("spool_dir") or DEFAULT_SPOOL_DIR
+
+
+def _job_paths(spool_dir, job_id):
+    return os.path.join(spool_dir, job_id + ".bin"), os.path.join(spool_dir, job_id + ".json")
+
+
+def _done_path(spool_dir, job_id):
+    return os.path.join(spool_dir, job_id + ".done")
+
+
+def _completed_id(spool_dir, job_id):
+    """Embeddr ID of a finished job, from memory or its on-disk done record."""
+    with _lock:
+        if job_id in _completed:
+            return _completed[job_id]
+    try:
+        with open(_done_path(spool_dir, job_id), "r") as f:
+            embeddr_id = json.load(f).get("embeddr_id")
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[Embeddr] Unreadable spool done record {job_id}: {e}")
+        return None
+    with _lock:
+        _completed[job_id] = embeddr_id
+    return embeddr_id
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _enqueue(write_payload, filename, mime, data, collection_id, config):
+    spool_dir = get_spool_dir(config)
+    os.makedirs(spool_dir, exist_ok=True)
+    job_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    data_path, meta_path = _job_paths(spool_dir, job_id)
+    write_payload(data_path)
+    # The sidecar is written last, so a job only exists once its payload is complete
+    _write_meta(meta_path, {
+        "id": job_id,
+        "filename": filename,
+        "mime": mime,
+        "data": data,
+        "collection_id": collection_id,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": 0,
+        "created_at": time.time(),
+        "last_error": None,
+    })
+    start_worker()
+    _wakeup.set()
+    return SPOOL_PREFIX + job_id
+
+
+def enqueue_bytes(content, filename, mime, data, collection_id=None, config=None):
+    """Persist an encoded upload to the spool and return its placeholder ID ("spool:<job>")."""
+    def write(path):
+        with open(path + ".tmp", "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+    return _enqueue(write, filename, mime, data, collection_id, config)
+
+
+def enqueue_file(source_path, filename, mime, data, collection_id=None, config=None):
+    """Move an already written file into the spool and return its placeholder ID."""
+    def write(path):
+        shutil.move(source_path, path)
+    return _enqueue(write, filename, mime, data, collection_id, config)
+
+
+def _list_jobs(spool_dir):
+    jobs = []
+    if not os.path.isdir(spool_dir):
+        return jobs
+    for name in sorted(os.listdir(spool_dir)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(spool_dir, name), "r") as f:
+                jobs.append(json.load(f))
+        except Exception as e:
+            print(f"[Embeddr] Skipping unreadable spool entry {name}: {e}")
+    return jobs
+
+
+def _parent_jobs(job):
+    parent_ids = job["data"].get("parent_ids") or ""
+    return {parent_id.strip()[len(SPOOL_PREFIX):] for parent_id in parent_ids.split(",")
+            if parent_id.strip().startswith(SPOOL_PREFIX)}
+
+
+def _resolve_parents(data, spool_dir):
+    parent_ids = data.get("parent_ids")
+    if not parent_ids or SPOOL_PREFIX not in parent_ids:
+        return data
+    resolved = []
+    for parent_id in parent_ids.split(","):
+        parent_id = parent_id.strip()
+        if parent_id.startswith(SPOOL_PREFIX):
+            job_id = parent_id[len(SPOOL_PREFIX):]
+            parent_id = _completed_id(spool_dir, job_id)
+            if parent_id is None:
+                print(f"[Embeddr] Spooled parent {job_id} is unknown; uploading without it")
+        if parent_id and parent_id != "-1":
+            resolved.append(parent_id)
+    data = dict(data)
+    data["parent_ids"] = ",".join(resolved)
+    return data
+
+
+def _process(spool_dir, job, config):
+    data_path, meta_path = _job_paths(spool_dir, job["id"])
+    try:
+        # The resumable session id lands in job["upload"] and is written with the
+        # sidecar on failure, so the next attempt resumes rather than restarts
+        response = upload_file(data_path, _resolve_parents(job["data"], spool_dir),
+                               job["filename"], job["mime"], config=config,
+                               resume_state=job.setdefault("upload", {}))
+        response.raise_for_status()
+        uploaded_id = response.json().get("id")
+
+        if job.get("collection_id") is not None and uploaded_id:
+            try:
+                api_post(f"collections/{job['collection_id']}/items",
+                         config=config, json={"image_id": uploaded_id}).raise_for_status()
+            except Exception as e:
+                print(f"[Embeddr] Failed to add spooled upload to collection: {e}")
+    except Exception as e:
+        max_attempts = int(config.get("spool_max_attempts", DEFAULT_MAX_ATTEMPTS))
+        job["attempts"] += 1
+        job["last_error"] = str(e)
+        if job["attempts"] >= max_attempts:
+            job["status"] = "failed"
+            print(f"[Embeddr] Spooled upload {job['id']} failed permanently: {e}")
+        else:
+            backoff = min(MAX_BACKOFF, BASE_BACKOFF * (2 ** (job["attempts"] - 1)))
+            job["next_attempt_at"] = time.time() + backoff
+        _write_meta(meta_path, job)
+        return False
+
+    # The done record outlives the job so children spooled against it still
+    # resolve after a restart; it is written before the sidecar goes away
+    done = {"id": job["id"], "embeddr_id": str(uploaded_id), "finished_at": time.time()}
+    _write_meta(_done_path(spool_dir, job["id"]), done)
+    with _lock:
+        _completed[job["id"]] = str(uploaded_id)
+        _recent.append(done)
+    for path in (meta_path, data_path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return True
+
+
+def _run():
+    while True:
+        # Cleared before scanning so an enqueue during the scan still wakes the next wait
+        _wakeup.clear()
+        config = get_config()
+        spool_dir = get_spool_dir(config)
+        now = time.time()
+        next_wake = None
+        jobs = _list_jobs(spool_dir)
+        # Jobs still waiting to upload; children referencing them via parent_ids must
+        # wait too. Failed parents hold their children until they are retried.
+        waiting = {job["id"] for job in jobs if job.get("status") == "failed"}
+        for job in jobs:
+            if job.get("status") != "pending":
+                continue
+            if job.get("next_attempt_at", 0) > now or _parent_jobs(job) & waiting:
+                waiting.add(job["id"])
+                if job.get("next_attempt_at", 0) > now:
+                    next_wake = min(next_wake or job["next_attempt_at"], job["next_attempt_at"])
+                continue
+            if not _process(spool_dir, job, config):
+                waiting.add(job["id"])
+                if job["status"] == "pending":
+                    next_wake = min(next_wake or job["next_attempt_at"], job["next_attempt_at"])
+            now = time.time()
+
+        _prune_done(spool_dir, config)
+        timeout = None if next_wake is None else max(0.5, next_wake - time.time())
+        _wakeup.wait(timeout)
+
+
+def _prune_done(spool_dir, config):
+    """Drop done records that no queued job refers to and that are past their retention."""
+    if not os.path.isdir(spool_dir):
+        return
+    retention = float(config.get("spool_done_retention", DEFAULT_DONE_RETENTION))
+    referenced = set()
+    for job in _list_jobs(spool_dir):
+        referenced |= _parent_jobs(job)
+    now = time.time()
+    for name in os.listdir(spool_dir):
+        if not name.endswith(".done"):
+            continue
+        job_id = name[:-len(".done")]
+        path = os.path.join(spool_dir, name)
+        try:
+            if job_id in referenced or now - os.path.getmtime(path) < retention:
+                continue
+            os.remove(path)
+        except OSError:
+            continue
+        with _lock:
+            _completed.pop(job_id, None)
+
+
+def start_worker():
+    """Start the background drain thread once per process; picks up jobs left from earlier runs."""
+    global _worker
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=_run, name="embeddr-spool", daemon=True)
+        _worker.start()
+
+
+def _summary(job):
+    return {key: job.get(key) for key in (
+        "id", "filename", "status", "attempts", "last_error", "created_at", "next_attempt_at")}
+
+
+def get_status(config=None):
+    jobs = _list_jobs(get_spool_dir(config))
+    with _lock:
+        recent = list(_recent)
+    return {
+        "pending": [_summary(job) for job in jobs if job.get("status") == "pending"],
+        "failed": [_summary(job) for job in jobs if job.get("status") == "failed"],
+        "completed": recent,
+    }
+
+
+def retry_failed(config=None):
+    """Move failed jobs back to pending and wake the worker. Returns how many were requeued."""
+    spool_dir = get_spool_dir(config)
+    count = 0
+    for job in _list_jobs(spool_dir):
+        if job.get("status") != "failed":
+            continue
+        job.update(status="pending", attempts=0, next_attempt_at=0)
+        _write_meta(_job_paths(spool_dir, job["id"])[1], job)
+        count += 1
+    if count:
+        start_worker()
+        _wakeup.set()
+    return count
+
+
+@metrics.register_collector
+def _spool_metrics():
+    if _worker is None:
+        return []
+    counts = {"pending": 0, "failed": 0}
+    for job in _list_jobs(get_spool_dir()):
+        if job.get("status") in counts:
+            counts[job["status"]] += 1
+    return [("embeddr_upload_queue_depth", {"status": status}, count)
+            for status, count in counts.items()]
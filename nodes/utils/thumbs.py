@@ -0,0 +1,94 @@
+import hashlib
+import threading
+from io import BytesIO
+from PIL import Image, ImageOps
+from .cache import LRUCache
+from .api import get_endpoint
+from .config import get_config
+from .disk_cache import get_disk_cache
+from .images import DEFAULT_THUMBNAIL_SIZE, _disk_key, _fetch_thumbnail, _side, fetch_image_bytes
+from . import metrics
+
+DEFAULT_THUMB_CACHE_MB = 64
+MIN_THUMB_SIZE = 16
+MAX_THUMB_SIZE = 2048
+THUMB_MIME = "image/webp"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_thumb_cache(config=None):
+    """Memory cache of encoded proxy thumbnails, sized by thumb_cache_mb."""
+    global _cache
+    if config is None:
+        config = get_config()
+    max_bytes = int(float(config.get("thumb_cache_mb", DEFAULT_THUMB_CACHE_MB)) * 1024 * 1024)
+    with _cache_lock:
+        if _cache is None:
+            _cache = LRUCache(max_bytes)
+        elif _cache.max_bytes != max_bytes:
+            _cache.resize(max_bytes)
+        return _cache
+
+
+def clamp_size(size, config=None):
+    if config is None:
+        config = get_config()
+    try:
+        size = int(size)
+    except:
+        size = int(config.get("thumbnail_size", DEFAULT_THUMBNAIL_SIZE))
+    return max(MIN_THUMB_SIZE, min(MAX_THUMB_SIZE, size))
+
+
+@metrics.timed("embeddr_thumb_render_seconds")
+def _render(content, size):
+    img = Image.open(BytesIO(content))
+    if img.format == "JPEG":
+        img.draft("RGB", (size, size))
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    out = BytesIO()
+    img.save(out, format="WEBP", quality=85, method=4)
+    return out.getvalue()
+
+
+def get_thumb(image_id, size, config=None):
+    """
+    Return (bytes, etag) for a WebP thumbnail of image_id whose longest side
+    is at most size, served from memory, then disk, then rendered from the
+    server's thumbnail (or the original when the thumbnail is too small).
+    """
+    if config is None:
+        config = get_config()
+    cache = get_thumb_cache(config)
+    key = ("thumb", get_endpoint(config), str(image_id), size)
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.inc("embeddr_thumb_total", result="memory")
+        return cached
+
+    disk_cache = get_disk_cache(config)
+    disk_key = _disk_key(image_id, config, f"thumb-{size}")
+    content, meta = disk_cache.get(disk_key) if disk_cache is not None else (None, None)
+    if content is not None and meta.get("etag"):
+        metrics.inc("embeddr_thumb_total", result="disk")
+        result = (content, meta["etag"])
+        cache.put(key, result)
+        return result
+
+    source = _fetch_thumbnail(image_id, config)
+    if source is None or _side(source, "longest_side") < size:
+        source = fetch_image_bytes(image_id, config)
+    content = _render(source, size)
+    etag = f'"{hashlib.blake2b(content, digest_size=12).hexdigest()}"'
+    metrics.inc("embeddr_thumb_total", result="rendered")
+
+    if disk_cache is not None:
+        disk_cache.put(disk_key, content, {"etag": etag})
+    result = (content, etag)
+    cache.put(key, result)
+    return result
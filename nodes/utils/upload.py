@@ -0,0 +1,247 @@
+import os
+import time
+import uuid
+import threading
+import requests
+from urllib3.exceptions import NewConnectionError
+from .api import api_get, api_post, request, get_upload_timeout
+from .config import get_config
+
+CHUNK_SIZE = 1024 * 1024
+# Containers whose muxers can write to a non-seekable stream. MP4/MOV/AVI
+# seek back to patch headers once encoding ends, so they need a real file.
+STREAMABLE_FORMATS = {"mkv", "webm"}
+
+
+class StreamProducerError(Exception):
+    """The payload producer of stream_upload failed; nothing complete reached the server."""
+
+
+def connect_failed(error):
+    """True when a request error happened before a connection existed, so nothing reached the server."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+class _PipeWriter:
+    """
+    Write-only end of a pipe. Deliberately has no seek() so muxers treat it as
+    a stream; name carries the file extension, which muxers such as PyAV use
+    to pick the container format for file objects.
+    """
+
+    def __init__(self, fd, name):
+        self._file = os.fdopen(fd, "wb")
+        self.name = name
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _multipart_body(boundary, fields, filename, mime, chunks):
+    for name, value in fields.items():
+        yield (f"--{boundary}\r\n"
+               f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+               f"{value}\r\n").encode("utf-8")
+    yield (f"--{boundary}\r\n"
+           f"Content-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+           f"Content-Type: {mime}\r\n\r\n").encode("utf-8")
+    yield from chunks
+    yield f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+
+def stream_upload(write_to, fields, filename, mime, config=None):
+    """
+    Upload a file to /images/upload while it is being produced.
+
+    write_to(stream) is run on a worker thread and writes the payload into a
+    pipe; the read end feeds a chunked multipart request, so encoding and
+    upload overlap and the payload never touches disk. Returns the response.
+    Raises StreamProducerError when write_to fails, so callers can fall back
+    to producing a file first.
+    """
+    if config is None:
+        config = get_config()
+    read_fd, write_fd = os.pipe()
+    writer = _PipeWriter(write_fd, filename)
+    errors = []
+    aborted = threading.Event()
+
+    def produce():
+        try:
+            write_to(writer)
+        except Exception as e:
+            # Once the request is abandoned, a broken pipe is not the producer's fault
+            if not aborted.is_set():
+                errors.append(e)
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=produce, name="embeddr-stream", daemon=True)
+    reader = os.fdopen(read_fd, "rb")
+
+    def chunks():
+        while True:
+            chunk = reader.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        thread.join()
+        if errors:
+            # Abort before the closing boundary so the server never sees a complete body
+            raise errors[0]
+
+    boundary = uuid.uuid4().hex
+    thread.start()
+    try:
+        return api_post(
+            "images/upload", config=config,
+            timeout=get_upload_timeout(config),
+            data=_multipart_body(boundary, fields, filename, mime, chunks()),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+    except Exception:
+        # Close the read end first: a producer blocked on a full pipe only
+        # returns once its next write fails with EPIPE
+        aborted.set()
+        reader.close()
+        thread.join()
+        # requests may wrap the producer's error; report it as the producer's
+        if errors:
+            raise StreamProducerError(str(errors[0])) from errors[0]
+        raise
+    finally:
+        reader.close()
+        thread.join()
+
+
+DEFAULT_PART_MB = 8
+DEFAULT_RESUMABLE_THRESHOLD_MB = 64
+DEFAULT_PART_RETRIES = 5
+# Seconds; doubled per consecutive failure of the same part
+PART_BACKOFF = 1.0
+
+
+class ResumableUnsupported(Exception):
+    pass
+
+
+def _single_shot(path, fields, filename, mime, config):
+    with open(path, "rb") as f:
+        files = {"file": (filename, f, mime)}
+        return api_post("images/upload", config=config,
+                        timeout=get_upload_timeout(config),
+                        files=files, data=fields)
+
+
+def _saved_offset(upload_id, config):
+    """Offset the server holds for a session from an earlier attempt, or None if it is gone."""
+    try:
+        response = api_get(f"uploads/{upload_id}", config=config)
+        if response.status_code != 200:
+            return None
+        return int(response.json().get("offset", 0))
+    except Exception as e:
+        print(f"[Embeddr] Could not query saved upload {upload_id}: {e}")
+        return None
+
+
+def _resumable(path, fields, filename, mime, config, resume_state=None):
+    """
+    Chunked upload protocol:
+      POST /uploads                     -> {"upload_id", "offset"}  (start a session)
+      PUT  /uploads/{id} + Content-Range -> {"offset"}              (send one part)
+      GET  /uploads/{id}                 -> {"offset"}              (ask where to resume)
+      POST /uploads/{id}/complete        -> image JSON              (commit with form fields)
+
+    resume_state is a dict the caller persists between attempts; the session
+    id is kept in it so a later attempt continues instead of starting over.
+    """
+    if resume_state is None:
+        resume_state = {}
+    size = os.path.getsize(path)
+    part_size = int(float(config.get("upload_part_mb", DEFAULT_PART_MB)) * 1024 * 1024)
+    retries = int(config.get("upload_part_retries", DEFAULT_PART_RETRIES))
+
+    upload_id = resume_state.get("upload_id")
+    offset = _saved_offset(upload_id, config) if upload_id else None
+    if offset is None:
+        response = api_post("uploads", config=config,
+                            json={"filename": filename, "mime": mime, "size": size})
+        if response.status_code in (404, 405, 501):
+            raise ResumableUnsupported()
+        response.raise_for_status()
+        session = response.json()
+        upload_id = session["upload_id"]
+        offset = int(session.get("offset", 0))
+        resume_state["upload_id"] = upload_id
+
+    failures = 0
+    with open(path, "rb") as f:
+        while offset < size:
+            f.seek(offset)
+            part = f.read(part_size)
+            end = offset + len(part) - 1
+            try:
+                response = request("PUT", f"uploads/{upload_id}", config=config,
+                                   timeout=get_upload_timeout(config), data=part,
+                                   headers={"Content-Range": f"bytes {offset}-{end}/{size}",
+                                            "Content-Type": "application/octet-stream"})
+                response.raise_for_status()
+                offset = int(response.json().get("offset", end + 1))
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures > retries:
+                    raise
+                print(f"[Embeddr] Upload part at {offset} failed ({e}), resuming...")
+                time.sleep(PART_BACKOFF * (2 ** (failures - 1)))
+                # The server is the source of truth for how much it has kept
+                try:
+                    status = api_get(f"uploads/{upload_id}", config=config)
+                    status.raise_for_status()
+                    offset = int(status.json().get("offset", offset))
+                except Exception as status_error:
+                    print(f"[Embeddr] Could not query upload offset: {status_error}")
+
+    response = api_post(f"uploads/{upload_id}/complete", config=config,
+                        timeout=get_upload_timeout(config), data=fields)
+    if response.ok:
+        resume_state.pop("upload_id", None)
+    return response
+
+
+def upload_file(path, fields, filename, mime, config=None, resume_state=None):
+    """
+    Upload a file on disk to Embeddr. Files above resumable_threshold_mb use
+    the resumable chunked protocol; servers without it get the single-shot
+    /images/upload. Returns the final response. Pass the same resume_state
+    dict on a retry to continue an interrupted resumable session.
+    """
+    if config is None:
+        config = get_config()
+    threshold = float(config.get("resumable_threshold_mb",
+                                 DEFAULT_RESUMABLE_THRESHOLD_MB)) * 1024 * 1024
+    if os.path.getsize(path) >= threshold:
+        try:
+            return _resumable(path, fields, filename, mime, config, resume_state)
+        except ResumableUnsupported:
+            print("[Embeddr] Server has no resumable uploads, falling back to single upload")
+    return _single_shot(path, fields, filename, mime, config)
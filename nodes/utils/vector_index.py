@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+from .api import api_get, get_endpoint
+from .config import get_config
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))), "cache", "index")
+SYNC_PAGE_SIZE = 1000
+DEFAULT_SYNC_INTERVAL = 300.0
+# Rows scored per matmul; bounds the temporary score matrix for big query batches
+QUERY_CHUNK = 256
+
+
+class VectorIndex:
+    """
+    Local mirror of the embedding vectors for one library/collection.
+
+    Vectors are L2-normalised float32 rows in a memory-mapped `vectors.f32`,
+    with the matching image IDs in `ids.npy` and the sync cursor in
+    `meta.json`, so cosine top-k is a single matrix product.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._ids = np.zeros((0,), dtype=np.int64)
+        self._rows = {}
+        self.meta = {"dim": None, "count": 0, "cursor": None}
+        self._load()
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, "vectors.f32")
+
+    @property
+    def _ids_path(self):
+        return os.path.join(self.directory, "ids.npy")
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, "meta.json")
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        try:
+            with open(self._meta_path, "r") as f:
+                self.meta = json.load(f)
+            self._ids = np.load(self._ids_path)
+            self._rows = {int(image_id): row for row, image_id in enumerate(self._ids)}
+            self._truncate()
+            self._map()
+        except Exception as e:
+            print(f"[Embeddr] Local index at {self.directory} is unreadable, resetting: {e}")
+            self.reset()
+
+    def _truncate(self):
+        """
+        Drop vector rows past the saved ID count. An interrupted upsert can
+        leave appended rows without IDs, which would shift every later row.
+        """
+        size = len(self._ids) * (self.meta.get("dim") or 0) * 4
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) > size:
+            os.truncate(self._vectors_path, size)
+
+    def _map(self):
+        count, dim = len(self._ids), self.meta.get("dim")
+        if count and dim:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32,
+                                      mode="r+", shape=(count, dim))
+        else:
+            self._vectors = None
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors is not None:
+            self._vectors.flush()
+        np.save(self._ids_path + ".tmp.npy", self._ids)
+        os.replace(self._ids_path + ".tmp.npy", self._ids_path)
+        self.meta["count"] = int(len(self._ids))
+        with open(self._meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f)
+        os.replace(self._meta_path + ".tmp", self._meta_path)
+
+    def reset(self):
+        with self._lock:
+            self._vectors = None
+            self._ids = np.zeros((0,), dtype=np.int64)
+            self._rows = {}
+            self.meta = {"dim": None, "count": 0, "cursor": None}
+            for path in (self._vectors_path, self._ids_path, self._meta_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def upsert(self, ids, vectors):
+        """Insert or overwrite rows. vectors is an [n, dim] array; rows are normalised here."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or not len(vectors):
+            return
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-12)
+
+        with self._lock:
+            if self.meta.get("dim") is None:
+                self.meta["dim"] = int(vectors.shape[1])
+            elif vectors.shape[1] != self.meta["dim"]:
+                raise ValueError(
+                    f"embedding size changed from {self.meta['dim']} to {vectors.shape[1]}; run a full sync")
+
+            new_ids, new_rows = [], []
+            for image_id, vector in zip(ids, vectors):
+                row = self._rows.get(int(image_id))
+                if row is None:
+                    new_ids.append(int(image_id))
+                    new_rows.append(vector)
+                else:
+                    self._vectors[row] = vector
+
+            if new_ids:
+                os.makedirs(self.directory, exist_ok=True)
+                if self._vectors is not None:
+                    self._vectors.flush()
+                # Write right after the last known row, then remap at the new length
+                start = len(self._ids)
+                mode = "r+b" if os.path.exists(self._vectors_path) else "wb"
+                with open(self._vectors_path, mode) as f:
+                    f.truncate(start * self.meta["dim"] * 4)
+                    f.seek(0, os.SEEK_END)
+                    f.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+                self._ids = np.concatenate([self._ids, np.asarray(new_ids, dtype=np.int64)])
+                for offset, image_id in enumerate(new_ids):
+                    self._rows[image_id] = start + offset
+                self._map()
+
+    def vector(self, image_id):
+        with self._lock:
+            row = self._rows.get(int(image_id))
+            return None if row is None else np.array(self._vectors[row])
+
+    def search(self, queries, k=10, exclude_self=None):
+        """
+        Top-k cosine search for one [dim] or many [n, dim] query vectors.
+        Returns one list of (image_id, score) per query, best first.
+        exclude_self optionally gives one image ID per query to leave out of its own results.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        if single:
+            queries = queries[None]
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            vectors, ids = self._vectors, self._ids
+        if vectors is None or not len(ids):
+            return [] if single else [[] for _ in range(len(queries))]
+
+        results = []
+        take = min(len(ids), k + (1 if exclude_self is not None else 0))
+        for start in range(0, len(queries), QUERY_CHUNK):
+            scores = queries[start:start + QUERY_CHUNK] @ vectors.T
+            if take < len(ids):
+                top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            else:
+                top = np.broadcast_to(np.arange(len(ids)), (len(scores), len(ids)))
+            for row, candidates in enumerate(top):
+                order = candidates[np.argsort(-scores[row, candidates])]
+                skip = exclude_self[start + row] if exclude_self is not None else None
+                hits = [(int(ids[i]), float(scores[row, i])) for i in order
+                        if skip is None or int(ids[i]) != int(skip)]
+                results.append(hits[:k])
+        return results[0] if single else results
+
+    def stats(self):
+        with self._lock:
+            return {"count": int(len(self._ids)), "dim": self.meta.get("dim"),
+                    "cursor": self.meta.get("cursor"), "directory": self.directory}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _scope_params(library_id, collection_id):
+    params = {}
+    if library_id is not None:
+        params["library_id"] = library_id
+    if collection_id is not None:
+        params["collection_id"] = collection_id
+    return params
+
+
+def get_index(library_id=None, collection_id=None, config=None):
+    """The local index for an endpoint + library/collection scope, opened once per process."""
+    if config is None:
+        config = get_config()
+    scope = f"{get_endpoint(config)}|{library_id}|{collection_id}"
+    root = config.get("index_dir") or DEFAULT_INDEX_DIR
+    directory = os.path.join(root, hashlib.sha1(scope.encode("utf-8")).hexdigest()[:16])
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = VectorIndex(directory)
+            index.meta.setdefault("scope", scope)
+            _indexes[directory] = index
+        return index
+
+
+def sync_index(library_id=None, collection_id=None, full=False, config=None):
+    """
+    Pull embeddings changed since the last sync from
+    GET /images/embeddings?updated_after=<cursor>&skip=&limit= and merge
+    them into the local index. full=True rebuilds from scratch, which is also
+    how deletions on the server are picked up.
+    """
+    if config is None:
+        config = get_config()
+    index = get_index(library_id, collection_id, config)
+    with index._lock:
+        if full:
+            index.reset()
+        params = _scope_params(library_id, collection_id)
+        params["limit"] = SYNC_PAGE_SIZE
+        if index.meta.get("cursor"):
+            params["updated_after"] = index.meta["cursor"]
+
+        cursor = index.meta.get("cursor")
+        offset = 0
+        synced = 0
+        while True:
+            params["skip"] = offset
+            response = api_get("images/embeddings", config=config, params=params)
+            response.raise_for_status()
+            items = response.json().get("items", [])
+            if not items:
+                break
+            index.upsert([item["id"] for item in items],
+                         [item["embedding"] for item in items])
+            # Persist each page under the old cursor, so an interrupted sync
+            # keeps its rows and the next one re-fetches the rest
+            index._save()
+            for item in items:
+                updated_at = item.get("updated_at")
+                if updated_at and (cursor is None or str(updated_at) > str(cursor)):
+                    cursor = str(updated_at)
+            synced += len(items)
+            offset += len(items)
+            if len(items) < SYNC_PAGE_SIZE:
+                break
+
+        index.meta["cursor"] = cursor
+        index.meta["synced_at"] = time.time()
+        index._save()
+    return {"synced": synced, **index.stats()}
+
+
+def ensure_synced(library_id=None, collection_id=None, config=None):
+    """Incrementally sync when the last sync is older than `index_sync_interval` seconds."""
+    if config is None:
+        config = get_config()
+    index = get_index(library_id, collection_id, config)
+    interval = float(config.get("index_sync_interval", DEFAULT_SYNC_INTERVAL))
+    if time.time() - index.meta.get("synced_at", 0) > interval:
+        try:
+            sync_index(library_id, collection_id, config=config)
+        except Exception as e:
+            # A stale local index is still useful; only fail when there is none
+            if not index.stats()["count"]:
+                raise
+            print(f"[Embeddr] Local index sync failed, using existing copy: {e}")
+    return index
@@ -0,0 +1,32 @@
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# nodes/ is imported as "embeddr_nodes", like benchmarks/run.py does: the repo
+# root __init__.py needs a running PromptServer.
+if "embeddr_nodes" not in sys.modules:
+    package = types.ModuleType("embeddr_nodes")
+    package.__path__ = [os.path.join(ROOT, "nodes")]
+    sys.modules["embeddr_nodes"] = package
+
+from fake_server import FakeEmbeddrServer  # noqa: E402
+
+
+@pytest.fixture
+def fake():
+    with FakeEmbeddrServer(image_count=4, width=64, height=48, keep_bodies=True) as server:
+        yield server
+
+
+@pytest.fixture
+def config(fake, tmp_path):
+    return {
+        "endpoint": fake.endpoint,
+        "disk_cache_dir": str(tmp_path / "files"),
+        "retry_backoff": 0.01,
+    }
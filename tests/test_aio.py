@@ -0,0 +1,28 @@
+import asyncio
+
+from embeddr_nodes.utils import aio, metrics
+
+
+def test_session_outlives_each_prompt_loop(config):
+    # ComfyUI runs every prompt in a fresh asyncio.run
+    statuses = [asyncio.run(aio.api_get("images", config=config)).status_code for _ in range(3)]
+    session = aio._session
+    assert statuses == [200, 200, 200]
+    assert asyncio.run(aio.api_get("images", config=config)).status_code == 200
+    assert aio._session is session and not session.closed
+
+    asyncio.run(aio.close_session())
+    assert session.closed
+    assert asyncio.run(aio.api_get("images", config=config)).status_code == 200
+    asyncio.run(aio.close_session())
+
+
+def test_upload_records_sent_bytes(config):
+    key = metrics._key("embeddr_http_sent_bytes_total", {"method": "POST", "path": metrics.path_group("images/upload")})
+    before = metrics._counters.get(key, 0)
+    content = b"\xff" * 10000
+    response = asyncio.run(aio.upload("images/upload", {"prompt": "x"},
+                                      {"file": ("image.png", content, "image/png")}, config=config))
+    asyncio.run(aio.close_session())
+    assert response.ok
+    assert metrics._counters.get(key, 0) - before > len(content)
@@ -0,0 +1,31 @@
+from embeddr_nodes.utils import changes
+from embeddr_nodes.utils.changes import listing_fingerprint
+
+
+def test_failed_probe_is_cached_and_not_retried(config, monkeypatch):
+    config["change_probe_interval"] = 60
+    calls = []
+
+    def failing_get(path, **kwargs):
+        calls.append(kwargs)
+        raise ConnectionError("refused")
+
+    monkeypatch.setattr(changes, "api_get", failing_get)
+    assert listing_fingerprint("All", "All", config) is None
+    assert listing_fingerprint("All", "All", config) is None
+    assert len(calls) == 1
+    assert calls[0]["retry"] is False
+    assert calls[0]["timeout"] == changes.PROBE_TIMEOUT
+
+
+def test_probe_recovers_after_the_interval(config, monkeypatch):
+    config["change_probe_interval"] = 0
+    api_get = changes.api_get
+
+    def failing_get(path, **kwargs):
+        raise ConnectionError("refused")
+
+    monkeypatch.setattr(changes, "api_get", failing_get)
+    assert listing_fingerprint("All", "All", config) is None
+    monkeypatch.setattr(changes, "api_get", api_get)
+    assert listing_fingerprint("All", "All", config) is not None
@@ -0,0 +1,60 @@
+import pytest
+
+from embeddr_nodes.utils import dedupe
+
+
+@pytest.fixture
+def index_config(config, tmp_path, monkeypatch):
+    monkeypatch.setattr(dedupe, "_entries", None)
+    monkeypatch.setattr(dedupe, "COMPACT_SLACK", 4)
+    config["dedupe_path"] = str(tmp_path / "hashes.jsonl")
+    return config
+
+
+def _reload(monkeypatch):
+    monkeypatch.setattr(dedupe, "_entries", None)
+
+
+def test_record_appends_and_replays(index_config, monkeypatch):
+    dedupe.record([("file", "a", 1), ("file", "b", 2)], index_config)
+    dedupe.record([("file", "a", 3)], index_config)
+    with open(index_config["dedupe_path"]) as f:
+        assert len(f.readlines()) == 3
+
+    _reload(monkeypatch)
+    assert dedupe.lookup("file", "a", index_config) == "3"
+    assert dedupe.lookup("file", "b", index_config) == "2"
+
+
+def test_log_is_compacted_once_it_outgrows_the_entries(index_config, monkeypatch):
+    for image_id in range(10):
+        dedupe.record([("file", "same", image_id)], index_config)
+    with open(index_config["dedupe_path"]) as f:
+        assert len(f.readlines()) <= 1 + dedupe.COMPACT_SLACK
+
+    _reload(monkeypatch)
+    assert dedupe.lookup("file", "same", index_config) == "9"
+
+
+def test_torn_line_is_skipped(index_config, monkeypatch):
+    dedupe.record([("pixels", "a", 1)], index_config)
+    with open(index_config["dedupe_path"], "a") as f:
+        f.write('["half')
+
+    _reload(monkeypatch)
+    assert dedupe.lookup("pixels", "a", index_config) == "1"
+    dedupe.record([("pixels", "b", 2)], index_config)
+
+    _reload(monkeypatch)
+    assert dedupe.lookup("pixels", "b", index_config) == "2"
+    assert dedupe.stats(index_config)["entries"] == 2
+
+
+def test_oldest_entries_are_evicted(index_config, monkeypatch):
+    index_config["dedupe_max_entries"] = 2
+    dedupe.record([("file", key, i) for i, key in enumerate("abc")], index_config)
+    assert dedupe.lookup("file", "a", index_config) is None
+
+    _reload(monkeypatch)
+    assert dedupe.lookup("file", "a", index_config) is None
+    assert dedupe.lookup("file", "c", index_config) == "2"
@@ -0,0 +1,25 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from embeddr_nodes.utils.encode import add_png_text, encode_image
+
+
+@pytest.mark.parametrize("caption", ["a red fox, 35mm", "ein Fuchs — 狐"])
+def test_add_png_text_keeps_pixels_and_adds_caption(caption):
+    array = np.random.default_rng(0).integers(0, 256, size=(8, 12, 3), dtype=np.uint8)
+    content, _, _ = encode_image(array, "png", 1)
+    tagged = add_png_text(content, "parameters", caption)
+
+    img = Image.open(BytesIO(tagged))
+    img.load()
+    assert img.text["parameters"] == caption
+    np.testing.assert_array_equal(np.asarray(img), array)
+
+
+def test_encode_image_is_caption_free():
+    array = np.zeros((4, 4, 3), dtype=np.uint8)
+    content, _, _ = encode_image(array, "png")
+    assert not Image.open(BytesIO(content)).text
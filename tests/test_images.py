@@ -0,0 +1,45 @@
+import pytest
+
+from embeddr_nodes.utils import images
+from embeddr_nodes.utils.images import load_raw_image
+from embeddr_nodes.utils.thumbs import get_thumb
+from fake_server import FakeEmbeddrServer
+
+
+@pytest.fixture
+def other():
+    with FakeEmbeddrServer(image_count=4, width=96, height=96) as server:
+        yield server
+
+
+def test_memory_cache_is_scoped_by_endpoint(fake, other, config):
+    config["disk_cache_mb"] = 0
+    first, _ = load_raw_image(1, config)
+    second, _ = load_raw_image(1, dict(config, endpoint=other.endpoint))
+    assert first.shape[1:3] == (48, 64)
+    assert second.shape[1:3] == (96, 96)
+
+
+def test_disk_cache_is_scoped_by_endpoint(fake, other, config):
+    # Both stand-ins send the same ETag for ID 1, so a shared entry would be revalidated with a 304
+    first, _ = load_raw_image(1, config, use_cache=False)
+    second, _ = load_raw_image(1, dict(config, endpoint=other.endpoint), use_cache=False)
+    assert first.shape[1:3] == (48, 64)
+    assert second.shape[1:3] == (96, 96)
+
+
+def test_thumbnails_are_scoped_by_endpoint(fake, other, config):
+    first, first_etag = get_thumb(1, 32, config)
+    second, second_etag = get_thumb(1, 32, dict(config, endpoint=other.endpoint))
+    assert first_etag != second_etag
+    assert get_thumb(1, 32, config) == (first, first_etag)
+
+
+def test_missing_thumbnail_is_a_miss_for_that_image_only(fake, config):
+    del fake.thumbnails[1]
+    # The stand-in's thumbnails are 512 px on the long side, its originals 64
+    without, _ = load_raw_image(1, config, resolution="thumbnail", use_cache=False)
+    with_thumb, _ = load_raw_image(2, config, resolution="thumbnail", use_cache=False)
+    assert without.shape[1:3] == (48, 64)
+    assert with_thumb.shape[1:3] == (384, 512)
+    assert fake.endpoint not in images._no_thumbnails
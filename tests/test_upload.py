@@ -0,0 +1,121 @@
+import os
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from embeddr_nodes.utils import upload
+
+
+def test_stream_upload_with_encoder_writing_to_pipe(fake, config):
+    # Pillow's PNG encoder writes block by block and never seeks, like a streaming muxer
+    image = Image.effect_noise((512, 512), 64).convert("RGB")
+    expected = BytesIO()
+    image.save(expected, format="PNG")
+
+    response = upload.stream_upload(
+        lambda stream: image.save(stream, format="PNG"),
+        {"prompt": "streamed"}, "image.png", "image/png", config=config)
+
+    response.raise_for_status()
+    body = fake.upload_bodies[response.json()["id"]]
+    assert expected.getvalue() in body
+    assert b'name="prompt"\r\n\r\nstreamed' in body
+
+
+def test_stream_upload_with_pyav_mkv(fake, config):
+    av = pytest.importorskip("av")
+    import numpy as np
+
+    def write(stream):
+        with av.open(stream, mode="w", format="matroska") as container:
+            video = container.add_stream("mpeg4", rate=8)
+            video.width, video.height = 64, 48
+            for i in range(8):
+                frame = av.VideoFrame.from_ndarray(
+                    np.full((48, 64, 3), i * 30, dtype=np.uint8), format="rgb24")
+                for packet in video.encode(frame):
+                    container.mux(packet)
+            for packet in video.encode():
+                container.mux(packet)
+
+    response = upload.stream_upload(write, {}, "video.mkv", "video/mkv", config=config)
+    response.raise_for_status()
+    # Matroska files start with the EBML magic
+    assert b"\x1a\x45\xdf\xa3" in fake.upload_bodies[response.json()["id"]]
+
+
+def test_stream_upload_producer_failure(fake, config):
+    def write(stream):
+        stream.write(b"partial")
+        raise RuntimeError("encoder exploded")
+
+    with pytest.raises(upload.StreamProducerError, match="encoder exploded"):
+        upload.stream_upload(write, {}, "video.mkv", "video/mkv", config=config)
+    assert fake.uploads == {}
+
+
+def test_stream_upload_unreachable_server_does_not_hang(config):
+    # Larger than any pipe buffer, so the producer blocks until the read end closes
+    config["endpoint"] = "http://127.0.0.1:1"
+    finished = threading.Event()
+    outcome = []
+
+    def run():
+        try:
+            upload.stream_upload(lambda stream: stream.write(b"\0" * (4 * 1024 * 1024)),
+                                 {}, "video.mkv", "video/mkv", config=config)
+        except Exception as e:
+            outcome.append(e)
+        finished.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    assert finished.wait(10), "stream_upload hung on an unreachable server"
+    assert not isinstance(outcome[0], upload.StreamProducerError)
+    assert upload.connect_failed(outcome[0])
+
+
+def test_resumable_upload_resumes_from_server_offset(fake, config, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "PART_BACKOFF", 0.0)
+    payload = os.urandom(5 * 1024 * 1024 + 123)
+    path = tmp_path / "video.mkv"
+    path.write_bytes(payload)
+    # The second part is cut off halfway: the server keeps half and the request fails
+    fake.drop_puts = {2}
+    config.update(resumable_threshold_mb=1, upload_part_mb=1)
+
+    response = upload.upload_file(str(path), {"prompt": "big"}, "video.mkv",
+                                  "video/mkv", config=config)
+
+    response.raise_for_status()
+    assert fake.uploads[response.json()["id"]] == len(payload)
+    assert bytes(fake.completed_sessions[-1]) == payload
+    # The retry started where the server said it was, not at the part boundary
+    offsets = [start for start, _ in fake.put_ranges]
+    assert offsets[2] == 1024 * 1024 + 512 * 1024
+
+
+def test_resumable_upload_reuses_saved_session(fake, config, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "PART_BACKOFF", 0.0)
+    payload = os.urandom(3 * 1024 * 1024)
+    path = tmp_path / "video.mkv"
+    path.write_bytes(payload)
+    config.update(resumable_threshold_mb=1, upload_part_mb=1, upload_part_retries=0)
+    fake.drop_puts = {2}
+
+    # First attempt gives up after the failed part; the session id is kept
+    state = {}
+    with pytest.raises(Exception):
+        upload.upload_file(str(path), {}, "video.mkv", "video/mkv", config=config,
+                           resume_state=state)
+    assert state["upload_id"] in fake.sessions
+
+    # The retry (as the spool would do) continues the same session
+    fake.drop_puts = set()
+    response = upload.upload_file(str(path), {}, "video.mkv", "video/mkv", config=config,
+                                  resume_state=state)
+    response.raise_for_status()
+    assert fake.uploads[response.json()["id"]] == len(payload)
+    starts = [start for start, _ in fake.put_ranges]
+    assert 0 not in starts[2:]
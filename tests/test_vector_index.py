@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from embeddr_nodes.utils import vector_index
+from embeddr_nodes.utils.vector_index import VectorIndex, get_index, sync_index
+
+
+def _unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_reopen_drops_rows_appended_after_the_last_save(tmp_path):
+    rng = np.random.default_rng(0)
+    saved = rng.normal(size=(3, 8))
+    index = VectorIndex(str(tmp_path))
+    index.upsert([1, 2, 3], saved)
+    index._save()
+    # Interrupted sync: rows reach vectors.f32 but ids.npy/meta.json never do
+    index.upsert([4, 5], rng.normal(size=(2, 8)))
+
+    index = VectorIndex(str(tmp_path))
+    assert os.path.getsize(index._vectors_path) == 3 * 8 * 4
+    extra = rng.normal(size=(1, 8))
+    index.upsert([6], extra)
+    np.testing.assert_allclose(index.vector(3), _unit(saved)[2], rtol=1e-6)
+    np.testing.assert_allclose(index.vector(6), _unit(extra)[0], rtol=1e-6)
+
+
+def test_upsert_overwrites_orphan_rows_in_place(tmp_path):
+    rng = np.random.default_rng(1)
+    index = VectorIndex(str(tmp_path))
+    index.upsert([1], rng.normal(size=(1, 4)))
+    with open(index._vectors_path, "ab") as f:
+        f.write(np.ones((2, 4), dtype=np.float32).tobytes())
+
+    fresh = rng.normal(size=(1, 4))
+    index.upsert([2], fresh)
+    assert os.path.getsize(index._vectors_path) == 2 * 4 * 4
+    np.testing.assert_allclose(index.vector(2), _unit(fresh)[0], rtol=1e-6)
+
+
+def test_interrupted_sync_keeps_finished_pages(fake, config, tmp_path, monkeypatch):
+    config["index_dir"] = str(tmp_path / "index")
+    monkeypatch.setattr(vector_index, "SYNC_PAGE_SIZE", 2)
+    api_get = vector_index.api_get
+    calls = []
+
+    def failing_get(path, **kwargs):
+        calls.append(path)
+        if len(calls) > 1:
+            raise ConnectionError("dropped")
+        return api_get(path, **kwargs)
+
+    monkeypatch.setattr(vector_index, "api_get", failing_get)
+    with pytest.raises(ConnectionError):
+        sync_index(config=config)
+
+    directory = get_index(config=config).directory
+    vector_index._indexes.clear()
+    assert VectorIndex(directory).stats()["count"] == 2
+
+    monkeypatch.setattr(vector_index, "api_get", api_get)
+    result = sync_index(config=config)
+    assert result["count"] == len(fake.ids())
+    for image_id in fake.ids():
+        np.testing.assert_allclose(get_index(config=config).vector(image_id),
+                                   _unit(fake.embeddings[image_id][None])[0], rtol=1e-5)
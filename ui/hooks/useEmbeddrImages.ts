@@ -80,7 +80,8 @@ export function useEmbeddrImages({
               id: item.id,
               prompt: item.prompt, // Use filename as prompt for now
               image_url: `${baseUrl}/images/${item.id}/file`,
-              thumb_url: `${baseUrl}/images/${item.id}/thumbnail`,
+              // Served and cached by the extension's thumbnail proxy
+              thumb_url: `/embeddr/thumb/${item.id}`,
               created_at: item.created_at,
               like_count: 0,
               liked_by_me: false,